@@ -0,0 +1,149 @@
+# benchmark_face_detectors.py
+
+import os
+import sys
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+
+from config import *
+from detection_region import DetectionRegion
+from face_detectors import DETECTOR_KINDS, HogDetector, create_detector
+from face_tracker import box_iou
+
+"""
+    Latency and recall of the face detector backends on the same recorded clip.
+
+    Every sampled frame of the video is cropped to DETECTION_ROI and scaled with
+    DETECTION_SCALE, like in the live pipeline, and handed to each backend.
+    There are no hand-made labels: the reference is HOG with one upsample on the
+    region at full resolution (slow, but the most complete detection we have),
+    so recall is "share of the reference faces a backend also found" and
+    'extra' counts boxes without a reference face (mostly false positives).
+    Boxes are compared in full frame coordinates, a match needs IoU >= --iou.
+
+    usage:
+        python benchmark_face_detectors.py visit.mp4 --every 5 --output detectors.json
+"""
+
+
+def match_boxes(reference, boxes, min_iou):
+    """Greedy one-to-one matching, returns the number of matched reference boxes."""
+    pairs = sorted(((box_iou(ref, box), r, b) for r, ref in enumerate(reference)
+                    for b, box in enumerate(boxes)), reverse=True)
+    used_ref, used_box = set(), set()
+    for iou, r, b in pairs:
+        if iou < min_iou:
+            break
+        if r not in used_ref and b not in used_box:
+            used_ref.add(r)
+            used_box.add(b)
+    return len(used_ref)
+
+
+def run(video_path, kinds, every=5, min_iou=0.3, max_frames=None):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video '{video_path}'")
+
+    detectors = {}
+    skipped = {}
+    for kind in kinds:
+        try:
+            detectors[kind] = create_detector(kind)
+        except (IOError, ValueError) as e:
+            skipped[kind] = str(e)
+            print(f"{kind}: skipped, {e}")
+    reference_detector = HogDetector(upsample=1)
+    region = DetectionRegion(DETECTION_ROI, scale=DETECTION_SCALE)
+    reference_region = DetectionRegion(DETECTION_ROI, scale=1.0)
+
+    stats = {kind: {"times": [], "found": 0, "boxes": 0} for kind in detectors}
+    reference_faces = 0
+    frames = 0
+    index = -1
+    while max_frames is None or frames < max_frames:
+        if not cap.grab():
+            break
+        index += 1
+        if index % every:
+            continue
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+        frames += 1
+
+        rgb = cv2.cvtColor(reference_region.prepare(frame), cv2.COLOR_BGR2RGB)
+        reference = [reference_region.to_frame(box)
+                     for box in reference_region.filter(reference_detector.detect(rgb))]
+        reference_faces += len(reference)
+
+        small_rgb = cv2.cvtColor(region.prepare(frame), cv2.COLOR_BGR2RGB)
+        for kind, detector in detectors.items():
+            start = time.perf_counter()
+            boxes = detector.detect(small_rgb)
+            stats[kind]["times"].append(time.perf_counter() - start)
+            boxes = [region.to_frame(box) for box in region.filter(boxes)]
+            stats[kind]["found"] += match_boxes(reference, boxes, min_iou)
+            stats[kind]["boxes"] += len(boxes)
+    cap.release()
+
+    backends = {}
+    for kind, values in stats.items():
+        times = np.array(values["times"] or [0.0]) * 1000
+        backends[kind] = {
+            "mean_ms": float(times.mean()),
+            "p50_ms": float(np.percentile(times, 50)),
+            "p95_ms": float(np.percentile(times, 95)),
+            "recall": values["found"] / reference_faces if reference_faces else None,
+            "extra": values["boxes"] - values["found"],
+        }
+    return {
+        "video": os.path.abspath(video_path),
+        "frames": frames,
+        "every": every,
+        "reference_faces": reference_faces,
+        "min_iou": min_iou,
+        "settings": {
+            "detection_roi": DETECTION_ROI,
+            "detection_scale": DETECTION_SCALE,
+        },
+        "backends": backends,
+        "skipped": skipped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Latency and recall of the face detector backends")
+    parser.add_argument("video", help="recorded video file")
+    parser.add_argument("--detectors", default=",".join(DETECTOR_KINDS),
+                        help=f"comma separated backends, default {','.join(DETECTOR_KINDS)}")
+    parser.add_argument("--every", type=int, default=5,
+                        help="use every N-th frame")
+    parser.add_argument("--iou", type=float, default=0.3,
+                        help="min IoU of a box matching a reference face")
+    parser.add_argument("--max-frames", type=int,
+                        help="stop after this number of sampled frames")
+    parser.add_argument(
+        "--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.video, args.detectors.split(","),
+                  args.every, args.iou, args.max_frames)
+    print(
+        f"{results['frames']} frames, {results['reference_faces']} reference faces, times in ms")
+    print(f"{'detector':>10}{'mean':>10}{'p50':>10}{'p95':>10}{'recall':>10}{'extra':>8}")
+    for kind, backend in results["backends"].items():
+        recall = f"{backend['recall']:.2f}" if backend["recall"] is not None else "-"
+        print(f"{kind:>10}{backend['mean_ms']:>10.1f}{backend['p50_ms']:>10.1f}{backend['p95_ms']:>10.1f}"
+              f"{recall:>10}{backend['extra']:>8}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+# benchmark_face_pipeline.py
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import threading
+import cv2
+import numpy as np
+
+import main_face
+from collections import deque
+from config import *
+
+"""
+    Offline replay benchmark of the face pipeline.
+
+    A recorded video is played through a file based VideoCaptureThread at its
+    own frame rate (like the live R20A stream, frames are dropped when the
+    pipeline is too slow) and proximity is simulated with time windows. The
+    frames go through the production loop (handle_face_detection and
+    Camera.run: governor, scheduler or worker pool, tracker, vote filter and
+    preview) of the first camera, with this capture injected.
+    Reported per run: processed fps, time per stage, the camera, worker and
+    governor metrics, time from the start of a proximity window / from the
+    deciding frame to the accepted event, CPU usage and peak RSS. Accepted
+    events are recorded only, the door relay is not triggered and no clip is
+    saved.
+
+    usage:
+        python benchmark_face_pipeline.py visit.mp4 --proximity 2-9,15-22 --output run.json
+"""
+
+
+class ReplayCaptureThread(main_face.VideoCaptureThread):
+    """Plays a video file at its frame rate (times 'speed'), like a live camera."""
+
+    def __init__(self, path, speed=1.0):
+        super().__init__(path)
+        if not self.cap.isOpened():
+            raise IOError(f"Cannot open video '{path}'")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+        self.speed = speed
+        self.started = None
+        self.frames_in_file = 0
+        self.finished = threading.Event()
+        # capture time of the recently published frames, by frame identity
+        self.recent = deque(maxlen=64)
+
+    def update(self):
+        self.started = time.time()
+        frame_interval = 1.0 / (self.fps * self.speed)
+        while self.running and not main_face.shutdown_event.is_set():
+            delay = self.started + self.frames_in_file * frame_interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            if not self.cap.grab():
+                break       # end of file
+            timestamp = time.time()
+            self.frames_in_file += 1
+            with self.lock:
+                wanted = self.waiting > 0
+            if not wanted:
+                continue
+            ret, frame = self.cap.retrieve()
+            if ret:
+                self.recent.append((frame, timestamp))
+                self.publish(timestamp, frame)
+        with self.new_frame:
+            self.running = False
+            self.new_frame.notify_all()
+        self.finished.set()
+
+    def video_time(self, timestamp):
+        """Position in the video of a frame captured at 'timestamp'."""
+        return (timestamp - self.started) * self.speed
+
+    def frame_time(self, frame):
+        """Capture time of a recently published frame, None if unknown."""
+        return next((timestamp for recent, timestamp in reversed(self.recent) if recent is frame), None)
+
+
+class StageTimer:
+    """Collects durations per pipeline stage."""
+
+    def __init__(self):
+        self.durations = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.durations.setdefault(stage, []).append(seconds)
+
+    def wrap(self, owner, name, stage):
+        """Time every call of the function or method 'name' of 'owner' (a class, instance or module)."""
+        function = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        setattr(owner, name, timed)
+
+    def summary(self):
+        summary = {}
+        for stage, values in self.durations.items():
+            values = np.array(values) * 1000
+            summary[stage] = {
+                "calls": len(values),
+                "mean_ms": float(values.mean()),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "total_s": float(values.sum() / 1000),
+            }
+        return summary
+
+
+def parse_windows(text, duration):
+    """'2-9,15-22' -> [(2.0, 9.0), (15.0, 22.0)]; None = the whole video."""
+    if not text:
+        return [(0.0, duration)]
+    windows = []
+    for part in text.split(","):
+        start, end = part.split("-")
+        windows.append((float(start), float(end)))
+    return windows
+
+
+def run(video_path, windows_text=None, speed=1.0):
+    """
+    Replay the video through the production detection loop: handle_face_detection()
+    with the first camera of config.py, its capture replaced by the replay and its
+    proximity sensor by the windows. Governor, scheduler or worker pool, tracker,
+    vote filter and preview all run as configured.
+    """
+    events = []
+    event_lock = threading.Lock()
+    timer = StageTimer()
+    counts = {"processed": 0, "gated": 0}
+    tracker_totals = {"encoded": 0, "reused": 0, "skipped": 0}
+    # the deciding frame of the current detection, set before the vote filter sees it
+    current = {"timestamp": None}
+
+    cap_thread = ReplayCaptureThread(video_path, speed=speed)
+    frame_count = cap_thread.cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    duration = float("inf")
+    if frame_count > 0:
+        duration = frame_count / cap_thread.fps
+    windows = parse_windows(windows_text, duration)
+
+    def window_at(timestamp):
+        if cap_thread.started is None:
+            return None
+        video_time = cap_thread.video_time(timestamp)
+        return next((w for w in windows if w[0] <= video_time < w[1]), None)
+
+    def window_start(timestamp):
+        window = window_at(timestamp)
+        return cap_thread.started + window[0] / speed if window is not None else timestamp
+
+    def record_event(camera, recognized_name, event_time, snapshot=None, unknown_encodings=None):
+        with event_lock:
+            events.append({
+                "name": recognized_name,
+                "since_window_start_ms": 1000 * (event_time - window_start(event_time)),
+                "since_frame_ms": 1000 * (event_time - current["timestamp"])
+                if current["timestamp"] is not None else None,
+            })
+
+    on_face_detected = main_face.on_face_detected
+
+    def count_and_detect(camera, frame, *args, **kwargs):
+        current["timestamp"] = cap_thread.frame_time(frame)
+        counts["processed"] += 1
+        return on_face_detected(camera, frame, *args, **kwargs)
+
+    def open_replay(url, ring_name, preroll=None):
+        return cap_thread.start()
+
+    # The clip is replayed as the first camera, without a second stream. Accepted
+    # events are recorded instead of opening the door and saving clips.
+    camera = main_face.cameras[0]
+    camera.sub_url = None
+    camera.proximity = camera.proximity or "replay"
+    camera.is_proximity_active = lambda: window_at(time.time()) is not None
+    camera.proximity_since = lambda: window_start(time.time())
+    main_face.cameras = [camera]
+    main_face.open_capture = open_replay
+    main_face.handle_accepted_event = record_event
+    main_face.on_face_detected = count_and_detect
+    # The replay is read in a thread: workers encode from the small frame.
+    main_face.CAPTURE_PROCESS_ENABLED = False
+    # Stay in the loop between the proximity windows (warm standby)
+    main_face.CONFIG_START_PROXIMITY_THD = False
+
+    # Time the stages of the in-thread detection; with workers detection and
+    # encoding run in their processes, see "pipeline" -> "workers".
+    timer.wrap(main_face.FramePreprocessor, "resize", "resize")
+    timer.wrap(main_face.FramePreprocessor, "to_rgb", "convert")
+    timer.wrap(main_face.face_quality, "assess", "quality")
+    timer.wrap(main_face.face_matcher, "encode", "encode")
+    timer.wrap(main_face.face_matcher, "encode_crops", "encode")
+    timer.wrap(main_face.face_matcher, "match", "match")
+    timer.wrap(main_face.Camera, "detect_in_thread", "frame")
+    timer.wrap(main_face.Camera, "publish_result", "frame")
+    motion_check = main_face.MotionGate.check
+
+    def gate(motion_gate, small_frame):
+        start = time.perf_counter()
+        moving = motion_check(motion_gate, small_frame)
+        timer.add("motion_gate", time.perf_counter() - start)
+        if not moving:
+            counts["gated"] += 1
+        return moving
+    main_face.MotionGate.check = gate
+    create_detector = main_face.create_detector
+
+    def create_timed_detector(kind):
+        detector = create_detector(kind)
+        timer.wrap(detector, "detect", "detect")
+        return detector
+    main_face.create_detector = create_timed_detector
+    tracker_reset = main_face.FaceTracker.reset
+
+    def reset_tracker(face_tracker):
+        # counters are cleared on every proximity change
+        tracker_totals["encoded"] += face_tracker.encoded
+        tracker_totals["reused"] += face_tracker.reused
+        tracker_totals["skipped"] += face_tracker.skipped
+        tracker_reset(face_tracker)
+    main_face.FaceTracker.reset = reset_tracker
+
+    pipeline = {}
+
+    def stop_at_end():
+        # end of the video: take the pipeline metrics while it is running, then stop it
+        cap_thread.finished.wait()
+        time.sleep(0.5)     # results still in flight
+        pipeline.update(main_face.camera_metrics())
+        main_face.shutdown_event.set()
+
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.time()
+    threading.Thread(target=stop_at_end, daemon=True).start()
+    main_face.handle_face_detection(False)
+
+    wall_time = time.time() - wall_start
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_time = (usage_end.ru_utime - usage_start.ru_utime) + \
+        (usage_end.ru_stime - usage_start.ru_stime)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    processed = counts["processed"]
+
+    return {
+        "video": os.path.abspath(video_path),
+        "video_fps": cap_thread.fps,
+        "frames_in_file": cap_thread.frames_in_file,
+        "proximity_windows": windows,
+        "speed": speed,
+        "settings": {
+            "detection_roi": camera.roi,
+            "detection_scale": DETECTION_SCALE,
+            "face_detector": FACE_DETECTOR,
+            "recognition_workers": RECOGNITION_WORKERS,
+            "governor": GOVERNOR_ENABLED,
+            "motion_gate": MOTION_GATE_ENABLED,
+            "motion_gate_threshold": MOTION_GATE_THRESHOLD,
+            "motion_gate_min_area": MOTION_GATE_MIN_AREA,
+            "tracker_reencode_interval": TRACKER_REENCODE_INTERVAL,
+            "vote_hits": VOTE_HITS,
+            "vote_window": VOTE_WINDOW,
+            "quality_gate": QUALITY_GATE_ENABLED,
+            "two_stage_encoding": TWO_STAGE_ENCODING,
+            "gallery_size": len(main_face.face_matcher),
+            "gallery_index": main_face.face_matcher.index.kind,
+        },
+        "wall_time_s": wall_time,
+        "frames_processed": processed,
+        "frames_gated": counts["gated"],
+        "processed_fps": processed / wall_time if wall_time > 0 else 0.0,
+        "stages": timer.summary(),
+        "pipeline": pipeline,
+        "tracker": tracker_totals,
+        "events": events,
+        "cpu_percent": 100 * cpu_time / wall_time if wall_time > 0 else 0.0,
+        "workers_cpu_s": children.ru_utime + children.ru_stime,
+        # ru_maxrss is in kB on Linux
+        "peak_rss_mb": usage_end.ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline replay benchmark of the face pipeline")
+    parser.add_argument("video", help="recorded video file")
+    parser.add_argument(
+        "--proximity", help="simulated proximity windows in seconds, e.g. 2-9,15-22")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="playback speed factor")
+    parser.add_argument(
+        "--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.video, args.proximity, args.speed)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# benchmark_gallery_index.py
+
+import sys
+import time
+import numpy as np
+
+from gallery_index import ENCODING_SIZE, BallTree, BruteForceIndex, BallTreeIndex
+
+"""
+    Query latency of the gallery indexes against gallery size.
+
+    Synthetic encodings are used (random 128-d vectors scaled like dlib face
+    descriptors), so the numbers show the search cost only, not the accuracy.
+
+    usage:
+        python benchmark_gallery_index.py [size1 size2 ...]
+"""
+
+DEFAULT_SIZES = [10, 50, 100, 500, 1000, 2000, 5000, 10000, 20000]
+FACES_PER_FRAME = 2
+REPEATS = 200
+
+
+def random_encodings(rng, count):
+    encodings = rng.normal(0.0, 1.0, (count, ENCODING_SIZE)).astype(np.float32)
+    # dlib encodings have a norm of roughly 1
+    encodings /= np.linalg.norm(encodings, axis=1, keepdims=True)
+    return encodings
+
+
+def measure(index, queries):
+    """Returns median and 95th percentile query time in ms."""
+    index.query(queries)      # warm up
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        index.query(queries)
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1000
+    return np.median(times), np.percentile(times, 95)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    rng = np.random.default_rng(0)
+    kinds = [BruteForceIndex]
+    if BallTree is not None:
+        kinds.append(BallTreeIndex)
+    else:
+        print("scikit-learn not installed, BallTree index skipped")
+
+    print(f"{FACES_PER_FRAME} faces per query, {REPEATS} repeats, times in ms (median / p95)")
+    header = f"{'gallery':>8}" + \
+        "".join(f"{kind.kind:>22}" for kind in kinds) + \
+        f"{'insert+delete':>16}"
+    print(header)
+    for size in sizes:
+        encodings = random_encodings(rng, size)
+        names = [f"person_{i}" for i in range(size)]
+        keys = list(range(size))
+        # queries close to gallery entries, like a known visitor
+        noise = rng.normal(0.0, 0.02, (FACES_PER_FRAME, ENCODING_SIZE))
+        queries = encodings[rng.integers(0, size, FACES_PER_FRAME)] + \
+            noise.astype(np.float32)
+
+        line = f"{size:>8}"
+        index = None
+        for kind in kinds:
+            index = kind()
+            index.build(encodings, names, keys)
+            median, p95 = measure(index, queries)
+            line += f"{median:>13.3f} / {p95:>6.3f}"
+
+        # incremental update cost of the last index kind
+        start = time.perf_counter()
+        new_encodings = random_encodings(rng, 10)
+        for i in range(10):
+            index.add(f"new_{i}", new_encodings[i], f"new_{i}")
+            index.remove(i)
+        line += f"{(time.perf_counter() - start) * 1000 / 20:>16.3f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
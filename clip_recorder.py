@@ -0,0 +1,242 @@
+# clip_recorder.py
+
+import os
+import glob
+import time
+import queue
+import shutil
+import threading
+import subprocess
+import cv2
+
+from helper import *
+from config import *
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def save_video(frames, recognized_name="Unknown", fps=20):
+    """ Saves the frames (any iterable, e.g. a decoding generator) into a video file """
+    frames = iter(frames)
+    first_frame = next(frames, None)
+    if first_frame is None:
+        return
+
+    date_string = get_current_date_time()
+    output_path = SYS_FACES_PATH + date_string + "_" + recognized_name + ".avi"
+    height, width, _ = first_frame.shape
+    fourcc = cv2.VideoWriter_fourcc(*"XVID")
+    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+
+    out.write(first_frame)
+    for frame in frames:
+        out.write(frame)
+
+    out.release()
+
+
+def save_snapshot(image, recognized_name="Unknown"):
+    """
+    Saves the event snapshot (BGR image) next to the clip and as the latest
+    event snapshot (EVENT_SNAPSHOT_PATH) used for push messages.
+    """
+    ok, jpeg = cv2.imencode(".jpg", image)
+    if not ok:
+        logger.warning(f"Failed to encode snapshot of {recognized_name}")
+        return
+    output_path = SYS_FACES_PATH + get_current_date_time() + "_" + \
+        recognized_name + ".jpg"
+    with open(output_path, "wb") as f:
+        f.write(jpeg.tobytes())
+    # replace atomically, the SIP process may read it at any time
+    tmp_path = EVENT_SNAPSHOT_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(jpeg.tobytes())
+    os.replace(tmp_path, EVENT_SNAPSHOT_PATH)
+
+
+class SegmentRemuxer:
+    """
+    Keeps a rolling set of short MPEG-TS segments of the camera stream on disk.
+
+    ffmpeg copies the original H.264 packets from RTSP into the segments
+    ('-c copy', no decode, no re-encode). A clip is the byte concatenation of
+    the segments covering the event window, which MPEG-TS allows, so
+    recording a visit costs almost no CPU.
+    """
+
+    def __init__(self, rtsp_url, segment_dir, segment_seconds=2, keep_seconds=30,
+                 ffmpeg=FFMPEG_EXECUTABLE):
+        self.rtsp_url = rtsp_url
+        self.segment_dir = segment_dir
+        self.segment_seconds = segment_seconds
+        self.segment_wrap = int(keep_seconds / segment_seconds) + 2
+        self.ffmpeg = ffmpeg
+        self.process = None
+
+    def available(self):
+        return shutil.which(self.ffmpeg) is not None
+
+    def start(self):
+        os.makedirs(self.segment_dir, exist_ok=True)
+        command = [
+            self.ffmpeg, "-hide_banner", "-loglevel", "error",
+            "-rtsp_transport", "tcp", "-i", self.rtsp_url,
+            "-map", "0:v", "-c", "copy",
+            "-f", "segment", "-segment_time", str(self.segment_seconds),
+            "-segment_wrap", str(self.segment_wrap), "-reset_timestamps", "1",
+            os.path.join(self.segment_dir, "seg%03d.ts"),
+        ]
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+        logger.info(
+            f"🎥 Remux segmenter started (pid={self.process.pid}, {self.segment_seconds}s segments)")
+
+    def ensure_running(self):
+        if self.process is not None and self.process.poll() is not None:
+            logger.warning(
+                f"⚠️ Remux segmenter exited with code {self.process.returncode}, restarting...")
+            self.start()
+
+    def save_clip(self, recognized_name, start, end):
+        """Concatenate the closed segments overlapping [start, end] into one .ts file."""
+        segments = []
+        for path in glob.glob(os.path.join(self.segment_dir, "seg*.ts")):
+            try:
+                closed_at = os.path.getmtime(path)
+            except OSError:
+                continue
+            # A segment covers roughly [mtime - segment_seconds, mtime]
+            if closed_at >= start and closed_at - self.segment_seconds <= end:
+                segments.append((closed_at, path))
+        if not segments:
+            logger.warning(
+                f"No remux segments found for clip of {recognized_name}")
+            return
+
+        date_string = get_current_date_time()
+        output_path = SYS_FACES_PATH + date_string + "_" + recognized_name + ".ts"
+        with open(output_path, "wb") as out:
+            for _closed_at, path in sorted(segments):
+                with open(path, "rb") as segment:
+                    shutil.copyfileobj(segment, out)
+        logger.info(
+            f"Saved remuxed clip {output_path} ({len(segments)} segments)")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class ClipRecorder:
+    """
+    Asynchronous recording service for event clips.
+
+    Events are put into a bounded job queue and written by a dedicated worker
+    thread (running at lower scheduling priority), so neither the relay path
+    nor the recognition loop waits for the clip. If the queue is full the clip
+    is dropped with a warning instead of blocking.
+
+    Modes:
+        "encode"  clip decoded from the JPEG pre-roll ring and encoded to XVID
+        "remux"   clip cut from the original H.264 packets (SegmentRemuxer)
+
+    The XVID encoding of a clip waits while 'defer' returns True (CPU short,
+    see FrameGovernor), at most 'max_defer' seconds; the frames of the clip
+    are taken from the ring before, so the wait loses nothing.
+    """
+
+    def __init__(self, preroll, mode="encode", queue_size=4, before=5, after=3, remuxer=None,
+                 defer=None, max_defer=30):
+        self.preroll = preroll
+        self.mode = mode
+        self.before = before
+        self.after = after
+        self.remuxer = remuxer
+        self.defer = defer
+        self.max_defer = max_defer
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.mode == "remux":
+            if self.remuxer is None or not self.remuxer.available():
+                logger.error(
+                    "❌ ffmpeg not found, falling back to encoded clips.")
+                self.mode = "encode"
+            else:
+                self.remuxer.start()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def record(self, recognized_name, event_time, snapshot=None):
+        """Queue a clip of the event (and its snapshot image, if any), never blocks."""
+        if self.mode == "encode":
+            # keep the ring fed for the post-roll even if proximity goes off meanwhile
+            self.preroll.hold(event_time + self.after)
+        try:
+            self.jobs.put_nowait((recognized_name, event_time, snapshot))
+        except queue.Full:
+            logger.warning(
+                f"⚠️ Clip queue full, clip of {recognized_name} dropped.")
+
+    def run(self):
+        try:
+            # Linux: lower the priority of this thread only
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+
+        while self.running:
+            if self.mode == "remux":
+                self.remuxer.ensure_running()
+            try:
+                recognized_name, event_time, snapshot = self.jobs.get(
+                    timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                if snapshot is not None:
+                    save_snapshot(snapshot, recognized_name)
+                self.write_clip(recognized_name, event_time)
+            except Exception as e:
+                logger.error(f"Failed to save clip of {recognized_name}: {e}")
+
+    def write_clip(self, recognized_name, event_time):
+        if self.mode == "remux":
+            # wait until the segment holding the post-roll is closed
+            delay = event_time + self.after + self.remuxer.segment_seconds + 0.5 - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.remuxer.save_clip(
+                recognized_name, event_time - self.before, event_time + self.after)
+        else:
+            frames, fps = self.preroll.clip(
+                event_time, self.before, self.after)
+            self.wait_deferred(recognized_name)
+            save_video(frames, recognized_name, fps)
+
+    def wait_deferred(self, recognized_name):
+        """Postpone the clip encoding while it is shed, at most 'max_defer' seconds."""
+        if self.defer is None or not self.defer():
+            return
+        logger.info(f"⏳ Clip of {recognized_name} deferred, CPU busy.")
+        until = time.time() + self.max_defer
+        while self.running and time.time() < until and self.defer():
+            time.sleep(0.5)
+
+    def stop(self):
+        self.running = False
+        # a clip being written is finished first; the thread must not restart the segmenter
+        if self.thread is not None:
+            self.thread.join(timeout=self.max_defer + 10)
+        if self.remuxer is not None:
+            self.remuxer.stop()
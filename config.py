@@ -14,14 +14,169 @@ LISTEN_PORT = int(os.getenv("LISTEN_PORT", "5060"))
 
 # doorbell R20A
 R20A_RTSP_URL = os.getenv("R20A_RTSP_URL", "rtsp://192.168.10.230/live/ch00_0")
+# low resolution substream, used for detection in dual-stream mode
+R20A_RTSP_SUB_URL = os.getenv(
+    "R20A_RTSP_SUB_URL", "rtsp://192.168.10.230/live/ch00_1")
 VOX_DOMAIN = os.getenv("VOX_DOMAIN", "192.168.10.230")
 VOX_HTTP_PORT = os.getenv("VOX_HTTP_PORT", "1088")
 VOX_RELAY_USER = os.getenv("VOX_RELAY_USER", "user_rel")
 VOX_RELAY_PASS = os.getenv("VOX_RELAY_PASS", "abcd_rel")
 
+# HTTP API of the face process (port 5000): token of the endpoints changing or exposing faces
+# (X-Api-Token header or ?token=...); not set = these endpoints accept local clients only
+API_TOKEN = os.getenv("API_TOKEN", "")
+
 # system folders
 SYS_LOG_PATH = "log/"
 SYS_FACES_PATH = "storage/"
+SYS_KNOWN_FACES_PATH = "known_faces/"
+# precomputed encodings of known faces (memory-mapped .npy + manifest)
+SYS_GALLERY_CACHE_PATH = "storage/gallery_cache/"
+# processes used to encode new/changed known faces, 0 = all cores
+GALLERY_ENCODE_WORKERS = int(os.getenv("GALLERY_ENCODE_WORKERS", "0"))
+# gallery search: "brute" (vectorized), "balltree" (scikit-learn) or "auto"
+GALLERY_INDEX = os.getenv("GALLERY_INDEX", "auto")
+# "auto" uses the BallTree from this number of known encodings; check with
+# benchmark_gallery_index.py, the BLAS brute force search wins up to tens of thousands
+GALLERY_BALLTREE_THRESHOLD = 50000
+
+# ---- Face recognition
+# Detection region as fractions of the frame: None = whole frame,
+# rectangle (x0, y0, x1, y1) or polygon [(x, y), ...]; e.g. (0.25, 0.1, 0.75, 0.9)
+DETECTION_ROI = None
+# scale factor applied to the region before detection (narrower region -> higher scale possible)
+DETECTION_SCALE = 0.25
+# Face detector backend: "hog", "dnn", "haar" or "haar+hog" (see face_detectors.py),
+# compare them on a recorded clip with benchmark_face_detectors.py
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "hog")
+FACE_HOG_UPSAMPLE = 1
+# OpenCV DNN SSD face detector (deploy.prototxt + res10_300x300_ssd_iter_140000.caffemodel)
+FACE_DNN_PROTOTXT = os.getenv(
+    "FACE_DNN_PROTOTXT", "/data/models/face_ssd/deploy.prototxt")
+FACE_DNN_MODEL = os.getenv(
+    "FACE_DNN_MODEL", "/data/models/face_ssd/res10_300x300_ssd_iter_140000.caffemodel")
+FACE_DNN_CONFIDENCE = 0.5
+# Haar cascade (bundled with OpenCV)
+FACE_HAAR_MIN_NEIGHBORS = 5
+FACE_HAAR_MIN_SIZE = 20         # smallest face in detection space pixels
+# Motion gate in front of HOG face detection (skip detection on static scene)
+MOTION_GATE_ENABLED = True
+# per pixel gray level difference counted as change
+MOTION_GATE_THRESHOLD = 25
+# fraction of region pixels that must change to run detection
+MOTION_GATE_MIN_AREA = 0.002
+# (x0, y0, x1, y1) as fractions of the detection region, None = whole region
+MOTION_GATE_REGION = None
+# seconds detection keeps running after the last motion or detected face
+MOTION_GATE_HOLD_TIME = 1.5
+# Face tracker: re-encode a tracked face every N frames
+TRACKER_REENCODE_INTERVAL = 5
+# ... or earlier when IoU with the box at the last encoding drops below this
+TRACKER_REENCODE_IOU = 0.6
+# Vote filter: an identity is accepted after VOTE_HITS recognitions within VOTE_WINDOW seconds,
+# its count restarts after a gap longer than VOTE_RESET_GAP seconds
+VOTE_HITS = 5
+VOTE_WINDOW = 1.2
+VOTE_RESET_GAP = 0.5
+# Face quality gate before encoding (thresholds in detection space, see face_quality.py)
+QUALITY_GATE_ENABLED = True
+QUALITY_MIN_FACE_SIZE = 24      # face box height in pixels
+QUALITY_MIN_SHARPNESS = 30.0    # variance of the Laplacian of the face crop
+QUALITY_MAX_YAW = 0.35          # nose offset from the eye center / eye distance
+# Best face crop of an event: margin around the face, and how long it is attached to push messages
+EVENT_SNAPSHOT_MARGIN = 0.3
+EVENT_SNAPSHOT_PATH = SYS_FACES_PATH + "last_event.jpg"
+EVENT_SNAPSHOT_MAX_AGE = 120
+# Unknown visitors: encodings of Unknown events clustered into stable pseudo-identities
+UNKNOWN_VISITORS_PATH = SYS_FACES_PATH + "unknown_visitors/"
+# max distance to a cluster centroid (stricter than matching)
+UNKNOWN_VISITOR_THRESHOLD = 0.5
+# least recently seen visitor is dropped above this
+UNKNOWN_VISITORS_MAX = 500
+# visitors seen this often are listed as enrollment candidates
+UNKNOWN_ENROLL_MIN_COUNT = 3
+# Dual-stream mode: detect on the substream, open the main stream only around proximity
+# for full resolution face crops and clips
+DUAL_STREAM_ENABLED = os.getenv("DUAL_STREAM_ENABLED", "0") == "1"
+# replaces DETECTION_SCALE, the substream is small already
+DUAL_STREAM_DETECTION_SCALE = 1.0
+# s, main stream frame used for face crops of a substream frame
+DUAL_STREAM_MAX_SKEW = 0.15
+# Two-stage recognition: detect on the small frame, encode from a padded full resolution crop
+TWO_STAGE_ENCODING = True
+ENCODE_CROP_PADDING = 0.5       # crop margin, fraction of the face box size
+# larger faces are downscaled in the crop (encoder uses 150 px)
+ENCODE_MAX_FACE_SIZE = 200
+# Capture in a separate process, frames shared through a shared memory ring (see shared_capture.py)
+CAPTURE_PROCESS_ENABLED = os.getenv("CAPTURE_PROCESS_ENABLED", "1") == "1"
+CAPTURE_RING_NAME = "doorbell_frames"
+# frames kept in the ring (memory = slots * width * height * 3)
+CAPTURE_RING_SLOTS = 8
+# Recognition worker processes (detect + encode + match), 0 = run in the capture loop thread
+RECOGNITION_WORKERS = int(os.getenv("RECOGNITION_WORKERS", "0"))
+# Cameras of the face process; models, gallery and recognition workers are shared,
+# each camera has its own capture, proximity binding, region, vote filter and clips
+#   name       used in logs, /cameras metrics and clip names (with more than one camera)
+#   url        RTSP stream; sub_url: substream for dual-stream mode, None = main stream only
+#   proximity  sensor name, heartbeats on /proximity/<name> (plain /proximity = "door"),
+#              None = detection always on, behind the motion gate
+#   roi        detection region, like DETECTION_ROI
+#   relay      R20A relay opened for known faces, None = no relay
+# e.g. {"name": "garage", "url": "rtsp://192.168.10.231/live/ch00_0", "sub_url": None,
+#       "proximity": "garage", "roi": None, "relay": None}
+# The pre-roll ring (PREROLL_MEMORY_MB) is allocated per camera.
+CAMERAS = [
+    {"name": "door", "url": R20A_RTSP_URL, "sub_url": R20A_RTSP_SUB_URL,
+     "proximity": "door", "roi": DETECTION_ROI, "relay": 1},
+]
+# Frame governor: per-frame deadline and detection rate adapted to the CPU (see frame_governor.py),
+# decisions in the /cameras metrics
+GOVERNOR_ENABLED = os.getenv("GOVERNOR_ENABLED", "1") == "1"
+# frames older than this (capture to processing) are dropped
+FRAME_MAX_AGE_MS = 500
+# max detection rate per camera (fps): no proximity / proximity active / SIP call connected
+GOVERNOR_RATES = {"idle": 5.0, "proximity": 10.0, "call": 6.0}
+# system CPU usage above GOVERNOR_CPU_TARGET sheds /identify requests, then preview,
+# then clip encoding, then lowers the detection rate down to GOVERNOR_MIN_RATE_FACTOR of the rate...
+GOVERNOR_CPU_TARGET = 0.8
+GOVERNOR_MIN_RATE_FACTOR = 0.2
+# ... but never below the rate the vote filter needs (VOTE_HITS within VOTE_WINDOW, gaps
+# up to VOTE_RESET_GAP), with a margin for jitter; slower detection accepts nobody
+GOVERNOR_MIN_RATE = 1.2 * max(VOTE_HITS / VOTE_WINDOW, 1.0 / VOTE_RESET_GAP)
+# pre-roll sampling interval multiplier while clip encoding is shed
+GOVERNOR_PREROLL_SCALE = 2
+CLIP_MAX_DEFER = 30             # seconds a clip encoding waits at most while it is shed
+# Event clips: JPEG pre-roll ring fed by the capture thread
+PREROLL_SECONDS = 5         # clip length before the event
+POSTROLL_SECONDS = 3        # clip length after the event
+PREROLL_FPS = 5             # frames per second stored in the ring
+PREROLL_MEMORY_MB = 32      # memory budget of the ring
+PREROLL_JPEG_QUALITY = 80
+# Feed the ring only while proximity is active (no JPEG encoding when idle)
+PREROLL_ONLY_ON_PROXIMITY = True
+# Clip recorder: "encode" = XVID from the pre-roll ring, "remux" = copy of the original H.264 stream
+RECORDER_MODE = os.getenv("RECORDER_MODE", "encode")
+RECORDER_QUEUE_SIZE = 4
+FFMPEG_EXECUTABLE = os.getenv("FFMPEG_EXECUTABLE", "ffmpeg")
+# remux mode: rolling MPEG-TS segments of the stream (tmpfs recommended)
+REMUX_SEGMENT_PATH = os.getenv("REMUX_SEGMENT_PATH", "/tmp/doorbell_segments/")
+REMUX_SEGMENT_SECONDS = 2
+# Live preview at http://<host>:5000/preview.mjpeg?token=<API_TOKEN> (no X11 needed),
+# frames encoded once for all clients; streams the door camera, so off by default
+PREVIEW_MJPEG_ENABLED = os.getenv("PREVIEW_MJPEG_ENABLED", "0") == "1"
+PREVIEW_MJPEG_SCALE = 0.5
+PREVIEW_MJPEG_QUALITY = 70
+# POST /identify: identification of JPEG images for other systems, with the loaded gallery
+IDENTIFY_ENABLED = True
+IDENTIFY_MAX_BATCH = 16         # images encoded and matched in one pass
+IDENTIFY_MAX_WAIT_MS = 5        # time to collect concurrent requests into one batch
+# longer image side for detection, faces are encoded at full resolution
+IDENTIFY_MAX_IMAGE_SIZE = 800
+# images waiting for a batch, more are rejected (HTTP 503)
+IDENTIFY_QUEUE_SIZE = 64
+# per uploaded image, larger ones are rejected (HTTP 413)
+IDENTIFY_MAX_BYTES = 8 * 1024 * 1024
+IDENTIFY_MAX_PIXELS = 4096 * 4096       # per image, larger ones are not decoded
 
 LANGUAGE = "PL"
 # LANGUAGE = "EN"
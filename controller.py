@@ -1,5 +1,6 @@
 # controller.py
 
+import os
 import threading
 import time
 import requests
@@ -335,13 +336,22 @@ class Controller:
             logger.error(f"Controller: No active call to play audio.")
 
     def push_message(self, message):
+        """ Push message, with the face snapshot of a recent doorbell event attached """
         url = "https://api.pushover.net/1/messages.json"
         data = {
             "token": PUSH_API_TOKEN,
             "user": PUSH_USER_KEY,
             "message": message
         }
-        response = requests.post(url, data=data)
+        try:
+            recent = time.time() - os.path.getmtime(EVENT_SNAPSHOT_PATH) < EVENT_SNAPSHOT_MAX_AGE
+        except OSError:
+            recent = False
+        if not recent:
+            return requests.post(url, data=data)
+        with open(EVENT_SNAPSHOT_PATH, "rb") as img_file:
+            files = {"attachment": img_file}
+            response = requests.post(url, data=data, files=files)
         return response
 
     def destroy(self):
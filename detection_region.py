@@ -0,0 +1,81 @@
+# detection_region.py
+
+import cv2
+import numpy as np
+
+
+class DetectionRegion:
+    """
+    Region of interest for face detection.
+
+    Detection runs only on the crop of the frame covered by the region,
+    downscaled by 'scale'. A narrower region allows a higher scale than 0.25
+    for the same HOG cost, so distant faces are found more easily.
+
+    'roi' is either None (whole frame), a rectangle (x0, y0, x1, y1) or a polygon
+    [(x, y), ...], all given as fractions of the frame size. A polygon is
+    cropped to its bounding rectangle and faces whose center lies outside
+    the polygon are dropped.
+    """
+
+    def __init__(self, roi=None, scale=0.25):
+        self.scale = scale
+        self.polygon = None
+        if roi is None:
+            self.rect = (0.0, 0.0, 1.0, 1.0)
+        elif len(roi) == 4 and not isinstance(roi[0], (tuple, list)):
+            self.rect = tuple(roi)
+        else:
+            points = np.asarray(roi, dtype=np.float32)
+            self.polygon = points
+            self.rect = (float(points[:, 0].min()), float(points[:, 1].min()),
+                         float(points[:, 0].max()), float(points[:, 1].max()))
+        self.frame_shape = None
+        self.offset = (0, 0)
+        self.pixel_rect = None
+        self.pixel_polygon = None
+
+    def update_geometry(self, frame_shape):
+        """Pixel coordinates of the region, recomputed only when the frame size changes."""
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = self.rect
+        left, top = int(x0 * width), int(y0 * height)
+        right, bottom = int(x1 * width), int(y1 * height)
+        self.pixel_rect = (top, right, bottom, left)
+        self.offset = (left, top)
+        if self.polygon is not None:
+            self.pixel_polygon = (
+                self.polygon * (width, height)).astype(np.float32)
+        self.frame_shape = frame_shape
+
+    def crop(self, frame):
+        """Returns the region of the frame (a view, no copy)."""
+        if frame.shape != self.frame_shape:
+            self.update_geometry(frame.shape)
+        top, right, bottom, left = self.pixel_rect
+        return frame[top:bottom, left:right]
+
+    def prepare(self, frame):
+        """Returns the downscaled BGR crop used for detection."""
+        return cv2.resize(self.crop(frame), (0, 0), fx=self.scale, fy=self.scale)
+
+    def to_frame(self, box):
+        """Map a (top, right, bottom, left) box from detection space to full frame space."""
+        top, right, bottom, left = box
+        offset_x, offset_y = self.offset
+        return (int(top / self.scale) + offset_y, int(right / self.scale) + offset_x,
+                int(bottom / self.scale) + offset_y, int(left / self.scale) + offset_x)
+
+    def contains(self, box):
+        """True if the center of a detection space box lies inside the region."""
+        if self.pixel_polygon is None:
+            return True
+        top, right, bottom, left = self.to_frame(box)
+        center = ((left + right) / 2.0, (top + bottom) / 2.0)
+        return cv2.pointPolygonTest(self.pixel_polygon, center, False) >= 0
+
+    def filter(self, face_locations):
+        """Drop faces outside the polygon (no-op for rectangles)."""
+        if self.pixel_polygon is None:
+            return face_locations
+        return [box for box in face_locations if self.contains(box)]
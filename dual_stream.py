@@ -0,0 +1,122 @@
+# dual_stream.py
+
+import time
+import threading
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def map_box(box, from_shape, to_shape):
+    """
+    Map a (top, right, bottom, left) box between two streams of the same view
+    (e.g. R20A substream -> main stream). x and y are scaled separately, so
+    streams with a different pixel aspect ratio map correctly too.
+    """
+    scale_y = to_shape[0] / from_shape[0]
+    scale_x = to_shape[1] / from_shape[1]
+    top, right, bottom, left = box
+    return (int(top * scale_y), int(right * scale_x), int(bottom * scale_y), int(left * scale_x))
+
+
+class OnDemandStream:
+    """
+    A capture that is open only while it is wanted.
+
+    Used for the R20A main stream in dual-stream mode: detection runs on the
+    substream, the main stream is opened on proximity (for full resolution face
+    crops and the clip pre-roll) and closed again after proximity ends and the
+    post-roll was recorded. Opening and closing run in a background thread, so
+    the detection loop never waits for the RTSP handshake.
+
+    'open_capture' is a callable returning a started capture with frame_near(),
+    valid() and stop() (VideoCaptureThread or CaptureProcess). Frames are read
+    outside the lock; closing waits for the reads in progress, so a capture is
+    never stopped under a reader.
+    """
+
+    def __init__(self, open_capture, name="main stream"):
+        self.open_capture = open_capture
+        self.name = name
+        self.capture = None
+        self.wanted = False
+        self.keep_until = 0
+        self.lock = threading.Lock()
+        self.readers = 0
+        self.reads_done = threading.Condition(self.lock)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def want(self, active, keep_until=0):
+        """Open the stream while 'active', keep it open at least until 'keep_until'."""
+        self.wanted = active
+        self.keep_until = max(self.keep_until, keep_until)
+
+    def needed(self):
+        return self.wanted or time.time() < self.keep_until
+
+    def run(self):
+        while self.running or time.time() < self.keep_until:
+            needed = self.needed() if self.running else time.time() < self.keep_until
+            if needed and self.capture is None:
+                start = time.time()
+                try:
+                    capture = self.open_capture()
+                except Exception as e:
+                    logger.error(f"❌ Cannot open {self.name}: {e}")
+                    time.sleep(1)
+                    continue
+                with self.lock:
+                    self.capture = capture
+                logger.info(
+                    f"🎥 {self.name} opened in {1000 * (time.time() - start):.0f} ms")
+            elif not needed and self.capture is not None:
+                self.close()
+            time.sleep(0.1)
+        self.close()
+
+    def close(self):
+        with self.lock:
+            capture, self.capture = self.capture, None
+            self.reads_done.wait_for(lambda: self.readers == 0)
+        if capture is not None:
+            capture.stop()
+            logger.info(f"🎥 {self.name} closed")
+
+    def frame_near(self, timestamp, max_skew):
+        """
+        Frame captured within 'max_skew' seconds of 'timestamp' (e.g. of a substream
+        frame), as (capture, seq, timestamp, frame); None if closed or there is none.
+        The frame is valid while valid(capture, seq) is True.
+        """
+        with self.lock:
+            capture = self.capture
+            if capture is None:
+                return None
+            self.readers += 1
+        try:
+            # may wait up to 'max_skew' for the frame (VideoCaptureThread)
+            seq, frame_time, frame = capture.frame_near(timestamp, max_skew)
+        finally:
+            with self.lock:
+                self.readers -= 1
+                self.reads_done.notify_all()
+        return (capture, seq, frame_time, frame) if frame is not None else None
+
+    def valid(self, capture, seq):
+        """True while the frame 'seq' of 'capture' (from frame_near()) was not overwritten or closed."""
+        with self.lock:
+            return capture is self.capture and capture.valid(seq)
+
+    def stop(self):
+        """Close the stream, after 'keep_until' (e.g. a running post-roll)."""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
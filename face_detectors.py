@@ -0,0 +1,124 @@
+# face_detectors.py
+
+import os
+import cv2
+import face_recognition
+
+from config import *
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+"""
+    Face detector backends. Every backend takes an RGB frame and returns the faces
+    as a list of (top, right, bottom, left) tuples of ints, like
+    face_recognition.face_locations(), so the tracker, quality gate and encoder
+    work with any of them.
+
+        hog       dlib HOG (face_recognition), the original detector
+        dnn       OpenCV DNN ResNet-10 SSD face detector (Caffe model files needed)
+        haar      OpenCV Haar cascade, fastest, most false positives
+        haar+hog  Haar cascade as a pre-filter: HOG runs only on frames where Haar found a face
+"""
+
+
+def clamp_box(top, right, bottom, left, shape):
+    height, width = shape[:2]
+    return (max(int(top), 0), min(int(right), width - 1),
+            min(int(bottom), height - 1), max(int(left), 0))
+
+
+class HogDetector:
+    kind = "hog"
+
+    def __init__(self, upsample=1):
+        self.upsample = upsample
+
+    def detect(self, rgb_frame):
+        return face_recognition.face_locations(rgb_frame, self.upsample, model='hog')
+
+
+class DnnDetector:
+    """OpenCV DNN SSD face detector (res10_300x300_ssd_iter_140000 Caffe model)."""
+    kind = "dnn"
+
+    def __init__(self, prototxt, model, confidence=0.5, input_size=300):
+        if not os.path.exists(prototxt) or not os.path.exists(model):
+            raise IOError(
+                f"DNN face detector model not found: '{prototxt}', '{model}'")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self.confidence = confidence
+        self.input_size = input_size
+
+    def detect(self, rgb_frame):
+        height, width = rgb_frame.shape[:2]
+        # the model expects BGR with the mean of its training set subtracted
+        blob = cv2.dnn.blobFromImage(rgb_frame, 1.0, (self.input_size, self.input_size),
+                                     (104.0, 177.0, 123.0), swapRB=True)
+        self.net.setInput(blob)
+        detections = self.net.forward()
+        boxes = []
+        for confidence, x0, y0, x1, y1 in detections[0, 0, :, 2:7]:
+            if confidence < self.confidence:
+                continue
+            box = clamp_box(y0 * height, x1 * width, y1 * height,
+                            x0 * width, rgb_frame.shape)
+            if box[2] > box[0] and box[1] > box[3]:
+                boxes.append(box)
+        return boxes
+
+
+class HaarDetector:
+    """OpenCV Haar cascade, frontal faces."""
+    kind = "haar"
+
+    def __init__(self, cascade_path=None, scale_factor=1.1, min_neighbors=5, min_size=20):
+        if cascade_path is None:
+            cascade_path = os.path.join(
+                cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise IOError(f"Haar cascade not found: '{cascade_path}'")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = (min_size, min_size)
+
+    def detect(self, rgb_frame):
+        gray = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY)
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor,
+                                              minNeighbors=self.min_neighbors, minSize=self.min_size)
+        return [clamp_box(y, x + w, y + h, x, rgb_frame.shape) for (x, y, w, h) in faces]
+
+
+class PrefilterDetector:
+    """Runs 'detector' only on frames where the cheap 'prefilter' finds a face."""
+
+    def __init__(self, prefilter, detector):
+        self.prefilter = prefilter
+        self.detector = detector
+        self.kind = f"{prefilter.kind}+{detector.kind}"
+
+    def detect(self, rgb_frame):
+        if not self.prefilter.detect(rgb_frame):
+            return []
+        return self.detector.detect(rgb_frame)
+
+
+DETECTOR_KINDS = ("hog", "dnn", "haar", "haar+hog")
+
+
+def create_detector(kind=FACE_DETECTOR):
+    """Detector backend by name, configured from config.py."""
+    if kind == "hog":
+        return HogDetector(upsample=FACE_HOG_UPSAMPLE)
+    if kind == "dnn":
+        return DnnDetector(FACE_DNN_PROTOTXT, FACE_DNN_MODEL, confidence=FACE_DNN_CONFIDENCE)
+    if kind == "haar":
+        return HaarDetector(min_neighbors=FACE_HAAR_MIN_NEIGHBORS, min_size=FACE_HAAR_MIN_SIZE)
+    if kind == "haar+hog":
+        return PrefilterDetector(
+            HaarDetector(min_neighbors=FACE_HAAR_MIN_NEIGHBORS,
+                         min_size=FACE_HAAR_MIN_SIZE),
+            HogDetector(upsample=FACE_HOG_UPSAMPLE))
+    raise ValueError(
+        f"Unknown face detector '{kind}', expected one of {DETECTOR_KINDS}")
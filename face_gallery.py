@@ -0,0 +1,254 @@
+# face_gallery.py
+
+import os
+import json
+import hashlib
+import numpy as np
+import face_recognition
+
+from concurrent.futures import ProcessPoolExecutor
+from face_matcher import ENCODING_SIZE
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+ENCODINGS_FILE = "encodings.npy"
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_sha256(filepath):
+    """Returns the sha256 hex digest of the file content."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_image_file(filepath):
+    """
+    Decode an image and compute the encoding of its first face.
+    Runs in the process pool, so it must stay a module level function.
+
+    Returns:
+        list of 128 floats, or None if no face was found.
+    """
+    image = face_recognition.load_image_file(filepath)
+    encodings = face_recognition.face_encodings(image)
+    if len(encodings) == 0:
+        return None
+    return [float(v) for v in encodings[0]]
+
+
+class GalleryCache:
+    """
+    Persistent cache of precomputed known-face encodings.
+
+    The cache directory holds:
+        encodings.npy   float32 (N, 128) matrix, loaded memory-mapped
+        manifest.json   one entry per image keyed by file path, with size,
+                        mtime, sha256, name and row in encodings.npy
+                        (row is None for images without a face)
+
+    On load only new or changed images are decoded and encoded (in a process
+    pool); an unchanged gallery is just a stat() per file plus an mmap.
+    A file whose size or mtime changed but whose content hash is the same
+    (e.g. touched or copied) is not re-encoded either.
+    After the first sync() of the process it also returns what changed, so a
+    loaded gallery can be updated entry by entry instead of replaced.
+    """
+
+    def __init__(self, cache_dir, workers=0):
+        self.cache_dir = cache_dir
+        self.synced = False     # the cache on disk matches the gallery returned last
+        self.workers = workers or os.cpu_count() or 1
+        self.encodings_path = os.path.join(cache_dir, ENCODINGS_FILE)
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+
+    def read(self):
+        """
+        Returns (entries, encodings) from disk, or ({}, None) if the cache
+        is missing or unreadable.
+        """
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") != MANIFEST_VERSION:
+                logger.info("Gallery cache version changed, rebuilding.")
+                return {}, None
+            encodings = np.load(self.encodings_path, mmap_mode="r")
+            if encodings.dtype != np.float32 or encodings.ndim != 2 or \
+                    encodings.shape[1] != ENCODING_SIZE:
+                logger.warning("Gallery cache has wrong shape, rebuilding.")
+                return {}, None
+            return manifest["entries"], encodings
+        except FileNotFoundError:
+            return {}, None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Gallery cache unreadable, rebuilding: {e}")
+            return {}, None
+
+    def write(self, entries, encodings):
+        """Atomically replace the cache files."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_encodings = self.encodings_path + ".tmp.npy"
+        tmp_manifest = self.manifest_path + ".tmp"
+        np.save(tmp_encodings,
+                np.ascontiguousarray(encodings, dtype=np.float32))
+        with open(tmp_manifest, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": entries}, f)
+        os.replace(tmp_encodings, self.encodings_path)
+        os.replace(tmp_manifest, self.manifest_path)
+
+    def encode_files(self, filepaths):
+        """Encode images, in a process pool when there is more than one."""
+        if len(filepaths) <= 1 or self.workers <= 1:
+            return [self._encode_safe(path) for path in filepaths]
+
+        workers = min(self.workers, len(filepaths))
+        logger.info(
+            f"Encoding {len(filepaths)} gallery images with {workers} processes...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(encode_image_file, path)
+                       for path in filepaths]
+            results = []
+            for path, future in zip(filepaths, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"Failed to encode {path}: {e}")
+                    results.append(None)
+            return results
+
+    @staticmethod
+    def _encode_safe(filepath):
+        try:
+            return encode_image_file(filepath)
+        except Exception as e:
+            logger.error(f"Failed to encode {filepath}: {e}")
+            return None
+
+    @staticmethod
+    def scan(known_faces_dir):
+        """Returns {filepath: os.stat_result} for all images, sorted by path."""
+        images = {}
+        for filename in sorted(os.listdir(known_faces_dir)):
+            if os.path.splitext(filename)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            filepath = os.path.join(known_faces_dir, filename)
+            try:
+                images[filepath] = os.stat(filepath)
+            except OSError as e:
+                logger.warning(f"Cannot stat {filepath}: {e}")
+        return images
+
+    def load(self, known_faces_dir):
+        """
+        Synchronize the cache with the directory and return the gallery.
+
+        Returns:
+            (encodings, names, keys): float32 (N, 128) array, list of N names
+            and list of N keys (image paths).
+        """
+        return self.sync(known_faces_dir)[:3]
+
+    def sync(self, known_faces_dir):
+        """
+        Like load(), and also returns the changes since the previous sync().
+
+        Returns:
+            (encodings, names, keys, changes): 'changes' is (changed, removed),
+            'changed' a list of (key, encoding, name) of new or re-encoded images
+            and 'removed' the keys of images deleted or without a face now;
+            None on the first sync of the process or after a failed cache
+            write (replace the whole gallery then).
+        """
+        incremental = self.synced
+        self.synced = False
+        old_entries, old_encodings = self.read()
+        images = self.scan(known_faces_dir)
+
+        entries = {}
+        reused = {}         # filepath -> encoding row from old cache (or None)
+        to_encode = []
+        for filepath, st in images.items():
+            old = old_entries.get(filepath)
+            entry = {
+                "size": st.st_size,
+                "mtime": st.st_mtime_ns,
+                "name": os.path.splitext(os.path.basename(filepath))[0],
+            }
+            if old is not None and old["size"] == st.st_size and old["mtime"] == st.st_mtime_ns:
+                entry["sha256"] = old["sha256"]
+                reused[filepath] = old["row"]
+            else:
+                entry["sha256"] = file_sha256(filepath)
+                if old is not None and old["sha256"] == entry["sha256"]:
+                    reused[filepath] = old["row"]
+                else:
+                    to_encode.append(filepath)
+            entries[filepath] = entry
+
+        new_encodings = dict(zip(to_encode, self.encode_files(to_encode)))
+        changed = bool(to_encode) or set(entries) != set(old_entries) or \
+            any(entries[p]["mtime"] != old_entries[p]["mtime"] for p in reused)
+
+        # Unchanged gallery: serve the memory-mapped matrix directly
+        if not changed and old_encodings is not None:
+            names = [None] * len(old_encodings)
+            keys = [None] * len(old_encodings)
+            for filepath, entry in entries.items():
+                entry["row"] = old_entries[filepath]["row"]
+                if entry["row"] is not None:
+                    names[entry["row"]] = entry["name"]
+                    keys[entry["row"]] = filepath
+            logger.info(
+                f"Loaded {len(names)} known faces from gallery cache (unchanged).")
+            self.synced = True
+            return old_encodings, names, keys, ([], []) if incremental else None
+
+        rows = []
+        names = []
+        keys = []
+        for filepath, entry in entries.items():
+            if filepath in new_encodings:
+                encoding = new_encodings[filepath]
+            else:
+                row = reused[filepath]
+                encoding = old_encodings[row] if row is not None else None
+
+            if encoding is None:
+                entry["row"] = None
+                if filepath in new_encodings:
+                    logger.warning(f"No face found in {filepath}")
+                continue
+            entry["row"] = len(rows)
+            rows.append(np.asarray(encoding, dtype=np.float32))
+            names.append(entry["name"])
+            keys.append(filepath)
+            if filepath in new_encodings:
+                logger.info(f"Loaded face: {entry['name']}")
+
+        if rows:
+            encodings = np.vstack(rows).astype(np.float32, copy=False)
+        else:
+            encodings = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+
+        try:
+            self.write(entries, encodings)
+            self.synced = True
+        except OSError as e:
+            logger.error(f"Failed to write gallery cache: {e}")
+
+        logger.info(
+            f"Gallery: {len(names)} known faces, {len(to_encode)} images encoded, "
+            f"{len(entries) - len(to_encode)} reused from cache.")
+        if not incremental:
+            return encodings, names, keys, None
+        changed = [(filepath, np.asarray(encoding, dtype=np.float32), entries[filepath]["name"])
+                   for filepath, encoding in new_encodings.items() if encoding is not None]
+        removed = [filepath for filepath, old in old_entries.items() if old["row"] is not None and
+                   (filepath not in entries or new_encodings.get(filepath, 0) is None)]
+        return encodings, names, keys, (changed, removed)
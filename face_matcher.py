@@ -0,0 +1,220 @@
+# face_matcher.py
+
+import time
+import cv2
+import numpy as np
+import face_recognition
+
+from gallery_index import ENCODING_SIZE, as_matrix, create_index
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+UNKNOWN_NAME = "Unknown"
+
+
+class FaceMatcher:
+    """
+    Batch encode-and-match engine for face recognition.
+
+    All faces of a frame are encoded in one call and matched against the
+    gallery in one query of the gallery index (see gallery_index.py): a
+    vectorized brute force search over one contiguous float32 matrix for
+    small galleries, or a BallTree for large ones. Each face gets the
+    closest gallery identity, not the first one below tolerance.
+
+    set_gallery() builds a new index and swaps it in as a whole, so a running
+    match never sees a half-built gallery; add() and remove() update the
+    current index incrementally. Listeners (e.g. the recognition worker pool
+    holding its own copies) are called after every change with the operation
+    and its arguments, ready for apply() on another matcher:
+        ("set", encodings, names, keys), ("add", key, encoding, name), ("remove", key)
+    """
+
+    def __init__(self, tolerance=0.6, index_kind="auto", balltree_threshold=50000):
+        self.tolerance = tolerance
+        self.index_kind = index_kind
+        self.balltree_threshold = balltree_threshold
+        self.index = create_index("brute")
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def names(self):
+        return self.snapshot()[1]
+
+    def set_gallery(self, encodings, names, keys=None):
+        """
+        Replace the whole gallery.
+
+        Args:
+            encodings: sequence of 128-d encodings (or an (N, 128) array).
+            names: sequence of N identity names, one per encoding.
+            keys: N unique keys (e.g. image paths) for later add()/remove(),
+                default is the position in the list.
+        """
+        if len(encodings) != len(names):
+            raise ValueError(
+                f"Gallery size mismatch: {len(encodings)} encodings, {len(names)} names")
+        if keys is None:
+            keys = list(range(len(names)))
+
+        index = create_index(self.index_kind, len(names),
+                             self.balltree_threshold)
+        index.build(encodings, names, keys)
+        self.index = index
+        logger.info(
+            f"Face gallery set: {len(names)} encodings ({index.kind} index)")
+        self.notify("set", encodings, names, keys)
+
+    def add(self, key, encoding, name):
+        """
+        Insert or replace one gallery entry. With index kind "auto", a brute
+        force gallery growing to 'balltree_threshold' encodings is moved to a
+        new BallTree index.
+        """
+        self.index.add(key, encoding, name)
+        if self.index_kind == "auto" and self.index.kind == "brute" and \
+                len(self.index) >= self.balltree_threshold:
+            index = create_index(
+                "auto", len(self.index), self.balltree_threshold)
+            if index.kind != self.index.kind:
+                index.build(*self.index.entries())
+                self.index = index
+                logger.info(
+                    f"Face gallery grew to {len(index)} encodings ({index.kind} index)")
+        self.notify("add", key, encoding, name)
+
+    def remove(self, key):
+        """Remove one gallery entry, returns False if the key is unknown."""
+        removed = self.index.remove(key)
+        if removed:
+            self.notify("remove", key)
+        return removed
+
+    def notify(self, operation, *args):
+        for listener in list(self.listeners):
+            listener(operation, *args)
+
+    def apply(self, operation, *args):
+        """Apply a change reported to the listeners of another matcher."""
+        apply = {"set": self.set_gallery, "add": self.add,
+                 "remove": self.remove}
+        apply[operation](*args)
+
+    def snapshot(self):
+        """Returns (encodings, names, keys) of the current gallery."""
+        return self.index.entries()
+
+    def encode(self, rgb_frame, face_locations):
+        """Compute encodings for all face locations of a frame in one call."""
+        if not face_locations:
+            return np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        return np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+
+    @staticmethod
+    def face_crop(frame, box, padding=0.5, max_face_size=200):
+        """
+        Padded RGB crop of one face from a full resolution BGR frame.
+        Faces larger than 'max_face_size' pixels are downscaled (the encoder
+        works on a 150 px face chip anyway).
+
+        Returns:
+            (rgb crop, box in crop coordinates)
+        """
+        top, right, bottom, left = box
+        pad_y = int((bottom - top) * padding)
+        pad_x = int((right - left) * padding)
+        height, width = frame.shape[:2]
+        y0, y1 = max(top - pad_y, 0), min(bottom + pad_y, height)
+        x0, x1 = max(left - pad_x, 0), min(right + pad_x, width)
+        crop = frame[y0:y1, x0:x1]
+        face_size = max(bottom - top, right - left, 1)
+        scale = min(1.0, max_face_size / float(face_size))
+        if scale < 1.0:
+            crop = cv2.resize(crop, (0, 0), fx=scale, fy=scale,
+                              interpolation=cv2.INTER_AREA)
+        crop_box = (int((top - y0) * scale), int((right - x0) * scale),
+                    int((bottom - y0) * scale), int((left - x0) * scale))
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB), crop_box
+
+    def encode_crops(self, frame, face_locations, padding=0.5, max_face_size=200):
+        """
+        Compute encodings from padded full resolution crops of a BGR frame,
+        'face_locations' given in full frame coordinates. Only the crops are
+        converted and processed at full resolution.
+        """
+        if not face_locations:
+            return np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        encodings = []
+        for box in face_locations:
+            crop, crop_box = self.face_crop(frame, box, padding, max_face_size)
+            encodings.append(
+                face_recognition.face_encodings(crop, [crop_box])[0])
+        return np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+
+    def match(self, encodings):
+        """
+        Match a batch of encodings against the gallery.
+
+        Returns:
+            list of (name, distance) tuples, one per encoding. Faces whose
+            closest gallery entry is above tolerance are named UNKNOWN_NAME;
+            distance is None when the gallery is empty.
+        """
+        queries = as_matrix(encodings)
+        if len(queries) == 0:
+            return []
+
+        names, distances = self.index.query(queries)
+        if names is None:
+            return [(UNKNOWN_NAME, None)] * len(queries)
+
+        results = []
+        for name, distance in zip(names, distances):
+            distance = float(distance)
+            if name is not None and distance <= self.tolerance:
+                results.append((name, distance))
+            else:
+                results.append((UNKNOWN_NAME, distance))
+        return results
+
+    def identify(self, rgb_frame, face_locations):
+        """Encode all faces of the frame and match them in one pass."""
+        return self.match(self.encode(rgb_frame, face_locations))
+
+    def identify_selected(self, rgb_frame, face_locations, selected, full_frame=None, to_full=None,
+                          padding=0.5, max_face_size=200):
+        """
+        Like identify(), but only faces with a true 'selected' flag are encoded.
+        With 'full_frame' (BGR) the faces are encoded from padded crops of it
+        (two-stage recognition), 'to_full' maps a box from 'rgb_frame' to
+        'full_frame' coordinates.
+        Returns (name, distance, encoding) per face, None for the skipped ones.
+        """
+        chosen = [box for box, keep in zip(face_locations, selected) if keep]
+        if full_frame is not None:
+            encodings = self.encode_crops(
+                full_frame, [to_full(box) for box in chosen], padding, max_face_size)
+        else:
+            encodings = self.encode(rgb_frame, chosen)
+        matches = iter([(name, distance, encoding) for (name, distance), encoding
+                        in zip(self.match(encodings), encodings)])
+        return [next(matches) if keep else None for keep in selected]
+
+
+def warm_up_models(size=(120, 160)):
+    """
+    Run one dummy detection and encoding, so the dlib models are loaded and
+    their first-call allocations are done before the first real frame.
+    Returns the time it took in seconds.
+    """
+    start = time.time()
+    dummy = np.zeros((size[0], size[1], 3), dtype=np.uint8)
+    face_recognition.face_locations(dummy, model='hog')
+    face_recognition.face_encodings(
+        dummy, [(10, size[1] - 10, size[0] - 10, 10)])
+    return time.time() - start
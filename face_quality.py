@@ -0,0 +1,120 @@
+# face_quality.py
+
+import cv2
+import numpy as np
+import face_recognition
+
+from collections import namedtuple
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Quality of one face box; 'passed' = worth encoding
+QualityScore = namedtuple("QualityScore", "score size sharpness yaw passed")
+
+
+class FaceQuality:
+    """
+    Quality scoring of detected faces before encoding.
+
+    Each face box is scored on:
+        size       box height in detection space pixels
+        sharpness  variance of the Laplacian of the gray face crop (low = blurred)
+        yaw        horizontal offset of the nose tip from the middle of the eyes,
+                   divided by the eye distance (0 = frontal, ~0.5 and more = profile),
+                   from the 5-point landmark model
+    A face below any of the thresholds is not encoded (it would not match at the
+    usual tolerance anyway). 'score' (0..1) combines the three measures and is
+    used to pick the best image of a visitor.
+    """
+
+    def __init__(self, min_size=24, min_sharpness=30.0, max_yaw=0.35, enabled=True):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.max_yaw = max_yaw
+        self.enabled = enabled
+
+    @staticmethod
+    def sharpness(rgb_frame, box):
+        top, right, bottom, left = box
+        crop = rgb_frame[max(top, 0):bottom, max(left, 0):right]
+        if crop.size == 0:
+            return 0.0
+        gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    @staticmethod
+    def yaw(landmarks):
+        """Nose tip offset from the eye center relative to the eye distance, 1.0 if unknown."""
+        try:
+            left_eye = np.mean(landmarks["left_eye"], axis=0)
+            right_eye = np.mean(landmarks["right_eye"], axis=0)
+            nose = np.asarray(landmarks["nose_tip"][0], dtype=np.float64)
+        except (KeyError, IndexError):
+            return 1.0
+        eye_distance = np.linalg.norm(right_eye - left_eye)
+        if eye_distance < 1:
+            return 1.0
+        return float(abs(nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_distance)
+
+    def assess(self, rgb_frame, face_locations):
+        """
+        Score all faces of a frame (one landmark call for all of them).
+
+        Returns:
+            list of QualityScore, in the same order as face_locations.
+        """
+        if not face_locations:
+            return []
+        all_landmarks = face_recognition.face_landmarks(
+            rgb_frame, face_locations, model="small")
+        scores = []
+        for box, landmarks in zip(face_locations, all_landmarks):
+            top, right, bottom, left = box
+            size = bottom - top
+            sharpness = self.sharpness(rgb_frame, box)
+            yaw = self.yaw(landmarks)
+            score = min(1.0, size / (2.0 * self.min_size)) * \
+                min(1.0, sharpness / (2.0 * self.min_sharpness)) * \
+                max(0.0, 1.0 - yaw / (2.0 * self.max_yaw))
+            passed = not self.enabled or (
+                size >= self.min_size and sharpness >= self.min_sharpness and yaw <= self.max_yaw)
+            scores.append(QualityScore(score, size, sharpness, yaw, passed))
+        return scores
+
+
+class BestFaceSelector:
+    """
+    Keeps the highest-scoring full resolution face crop per identity
+    until the event of that identity is accepted (take()) or reset().
+    """
+
+    def __init__(self, margin=0.3):
+        self.margin = margin
+        self.best = {}      # name -> (score, crop)
+
+    def better(self, name, score):
+        """True if 'score' beats the best crop kept for 'name'."""
+        best = self.best.get(name)
+        return best is None or score > best[0]
+
+    def offer(self, name, score, frame, box):
+        """'box' is (top, right, bottom, left) in 'frame' coordinates; the crop is copied."""
+        if not self.better(name, score):
+            return
+        top, right, bottom, left = box
+        pad_y = int((bottom - top) * self.margin)
+        pad_x = int((right - left) * self.margin)
+        height, width = frame.shape[:2]
+        crop = frame[max(top - pad_y, 0):min(bottom + pad_y, height),
+                     max(left - pad_x, 0):min(right + pad_x, width)]
+        if crop.size:
+            self.best[name] = (score, crop.copy())
+
+    def take(self, name):
+        """Returns the best crop of 'name' (BGR) or None, and forgets it."""
+        best = self.best.pop(name, None)
+        return best[1] if best is not None else None
+
+    def reset(self):
+        self.best.clear()
@@ -0,0 +1,193 @@
+# face_tracker.py
+
+import itertools
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def box_iou(box_a, box_b):
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top_a, right_a, bottom_a, left_a = box_a
+    top_b, right_b, bottom_b, left_b = box_b
+    inter_w = min(right_a, right_b) - max(left_a, left_b)
+    inter_h = min(bottom_a, bottom_b) - max(top_a, top_b)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    area_a = (right_a - left_a) * (bottom_a - top_a)
+    area_b = (right_b - left_b) * (bottom_b - top_b)
+    return inter / float(area_a + area_b - inter)
+
+
+class Track:
+    """One face followed across frames."""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.name = None              # None = not identified yet
+        self.distance = None
+        self.encoding = None          # encoding of the last identification
+        self.encoded_box = None       # box at the last encoding, None = never encoded
+        self.frames_since_encode = 0
+        self.fresh = False            # identity from an encoding of the current frame
+        self.streak = 0               # consecutive encodings matching the same name
+        self.missed = 0
+
+    def __repr__(self):
+        return f"Track({self.track_id}, {self.name}, {self.box})"
+
+
+class FaceTracker:
+    """
+    Lightweight multi-face tracker with greedy IoU association.
+
+    Every face box from face_locations() is assigned to a track; the track
+    keeps the identity from its last encoding. A track is re-encoded only every
+    'reencode_interval' frames, or when its box moved/resized so that the IoU
+    with the box at the last encoding drops below 'reencode_iou'.
+    A face the encoder skipped (e.g. too low quality) keeps its previous identity
+    and is tried again on the next frame.
+    Until 'confirm_hits' consecutive encodings of a track matched the same name,
+    it is encoded on every frame, so a vote filter counting only fresh
+    identities (Track.fresh) still gets one encoding per vote.
+    """
+
+    def __init__(self, match_iou=0.3, reencode_iou=0.6, reencode_interval=5, max_missed=3,
+                 confirm_hits=0):
+        self.match_iou = match_iou
+        self.reencode_iou = reencode_iou
+        self.reencode_interval = reencode_interval
+        self.max_missed = max_missed
+        self.confirm_hits = confirm_hits
+        self.tracks = []
+        self.ids = itertools.count(1)
+        self.encoded = 0
+        self.reused = 0
+        self.skipped = 0
+
+    def update(self, face_locations):
+        """
+        Associate the face boxes of a new frame with tracks.
+
+        Returns:
+            list of tracks, in the same order as face_locations.
+        """
+        pairs = []
+        for t_index, track in enumerate(self.tracks):
+            for b_index, box in enumerate(face_locations):
+                iou = box_iou(track.box, box)
+                if iou >= self.match_iou:
+                    pairs.append((iou, t_index, b_index))
+        pairs.sort(reverse=True)
+
+        assigned = [None] * len(face_locations)
+        used_tracks = set()
+        for _iou, t_index, b_index in pairs:
+            if t_index in used_tracks or assigned[b_index] is not None:
+                continue
+            used_tracks.add(t_index)
+            assigned[b_index] = self.tracks[t_index]
+
+        for t_index, track in enumerate(self.tracks):
+            track.fresh = False
+            if t_index not in used_tracks:
+                track.missed += 1
+
+        for b_index, box in enumerate(face_locations):
+            track = assigned[b_index]
+            if track is None:
+                track = Track(next(self.ids), box)
+                self.tracks.append(track)
+                logger.debug(f"New face track {track.track_id}")
+            track.box = box
+            track.missed = 0
+            track.frames_since_encode += 1
+            assigned[b_index] = track
+
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+        return assigned
+
+    def needs_encode(self, track):
+        if track.encoded_box is None or track.streak < self.confirm_hits:
+            return True
+        if track.frames_since_encode >= self.reencode_interval:
+            return True
+        return box_iou(track.box, track.encoded_box) < self.reencode_iou
+
+    def set_identity(self, track, name, distance, encoding=None):
+        track.streak = track.streak + 1 if name == track.name else 1
+        track.fresh = True
+        track.name = name
+        track.distance = distance
+        track.encoding = encoding
+        track.encoded_box = track.box
+        track.frames_since_encode = 0
+
+    def identify(self, face_locations, encode_and_match):
+        """
+        Update tracks and identify only the faces that need a new encoding.
+
+        Args:
+            face_locations: face boxes of the current frame.
+            encode_and_match: callable(list of boxes) -> list of (name, distance)
+                or (name, distance, encoding), or None for a box that was not encoded.
+
+        Returns:
+            list of tracks, in the same order as face_locations.
+        """
+        tracks = self.update(face_locations)
+        stale = [track for track in tracks if self.needs_encode(track)]
+        skipped = 0
+        if stale:
+            results = encode_and_match([track.box for track in stale])
+            for track, result in zip(stale, results):
+                if result is None:
+                    skipped += 1
+                    continue
+                self.set_identity(track, *result)
+        self.encoded += len(stale) - skipped
+        self.skipped += skipped
+        self.reused += len(tracks) - len(stale)
+        return tracks
+
+    def follow(self, face_locations, matches, encoded):
+        """
+        Update tracks with the decisions of another tracker, e.g. the one of a
+        recognition worker that saw the frame before it was encoded.
+
+        Args:
+            face_locations: face boxes of the current frame.
+            matches: (name, distance, encoding) of each box on the other tracker,
+                None for a face it has not identified yet.
+            encoded: per box True if it was encoded on this frame, False if the
+                other tracker reused the identity, None if it was skipped.
+
+        Returns:
+            list of tracks, in the same order as face_locations.
+        """
+        tracks = self.update(face_locations)
+        for track, match, was_encoded in zip(tracks, matches, encoded):
+            if was_encoded:
+                self.set_identity(track, *match)
+                self.encoded += 1
+            elif was_encoded is None:
+                self.skipped += 1
+            else:
+                self.reused += 1
+                if track.name is None and match is not None:
+                    # new track here, known to the other tracker
+                    track.name, track.distance, track.encoding = match
+        return tracks
+
+    def reset(self):
+        if self.encoded or self.reused or self.skipped:
+            logger.debug(
+                f"Face tracker: {self.encoded} encodings, {self.reused} identities reused, "
+                f"{self.skipped} low quality faces skipped")
+        self.tracks = []
+        self.encoded = 0
+        self.reused = 0
+        self.skipped = 0
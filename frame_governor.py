@@ -0,0 +1,169 @@
+# frame_governor.py
+
+import time
+import threading
+
+from collections import Counter
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Camera states, each with its own maximum detection rate
+# no proximity (camera without sensor, detection always on)
+IDLE = "idle"
+PROXIMITY = "proximity"     # proximity sensor of the camera active
+CALL = "call"               # SIP call connected, Vosk and Piper need the CPU
+# Optional work, shed in this order when the CPU is short
+SHED_ORDER = ("identify", "preview", "recording")
+
+
+def read_cpu_times():
+    """(busy, total) jiffies of all CPUs from /proc/stat, None if not available."""
+    try:
+        with open("/proc/stat", "r") as f:
+            values = [int(value) for value in f.readline().split()[1:9]]
+    except (OSError, ValueError):
+        return None
+    idle = values[3] + values[4]    # idle + iowait
+    total = sum(values)
+    return total - idle, total
+
+
+class FrameGovernor:
+    """
+    Deadline and adaptive rate of the frame processing in the detection loops.
+
+    A frame is processed only if it is fresh and due:
+        stale  older than 'max_age' seconds (capture to processing), a decision
+               made on it would come too late
+        rate   the camera had a frame less than 1 / rate seconds ago
+    The rate is the maximum of the camera state ('rates': idle, proximity,
+    call) times a factor following the system CPU usage, measured over all
+    processes every 'interval' seconds. Above 'cpu_target' the optional work
+    is shed first (identify requests, preview, then recording encode) and only then the
+    detection rate is lowered, down to 'min_factor'; below 'cpu_target' minus
+    'hysteresis' the steps are undone in reverse order.
+    The rate never drops below 'min_rate', the slowest detection the vote
+    filter can still accept an identity with.
+    All decisions are counted per camera, see metrics().
+    """
+
+    def __init__(self, max_age=0.5, rates=None, cpu_target=0.8, hysteresis=0.15, min_factor=0.2,
+                 min_rate=5.0, interval=1.0, enabled=True):
+        self.max_age = max_age
+        self.rates = rates or {IDLE: 5.0, PROXIMITY: 10.0, CALL: 6.0}
+        self.min_rate = min_rate
+        self.cpu_target = cpu_target
+        self.hysteresis = hysteresis
+        self.min_factor = min_factor
+        self.interval = interval
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.factor = 1.0
+        self.shed_level = 0
+        self.cpu_usage = None
+        self.last_cpu = read_cpu_times()
+        self.last_sample = time.time()
+        self.next_due = {}      # camera -> earliest time of its next frame
+        self.states = {}        # camera -> state of its last frame
+        self.counts = {}        # camera -> Counter of decisions
+
+    @staticmethod
+    def state(proximity_active, call_active):
+        if call_active:
+            return CALL
+        return PROXIMITY if proximity_active else IDLE
+
+    def rate(self, state):
+        return max(self.rates[state] * self.factor, self.min_rate)
+
+    def sample(self, now):
+        """Measure the CPU usage and adjust shedding and rate (called with the lock held)."""
+        if now - self.last_sample < self.interval:
+            return
+        self.last_sample = now
+        cpu = read_cpu_times()
+        if cpu is None or self.last_cpu is None or cpu[1] <= self.last_cpu[1]:
+            self.last_cpu = cpu
+            return
+        self.cpu_usage = (cpu[0] - self.last_cpu[0]) / \
+            float(cpu[1] - self.last_cpu[1])
+        self.last_cpu = cpu
+        if not self.enabled:
+            return
+
+        if self.cpu_usage > self.cpu_target:
+            if self.shed_level < len(SHED_ORDER):
+                self.shed_level += 1
+                logger.info(f"⚙️ Governor: CPU {100 * self.cpu_usage:.0f}%, "
+                            f"shedding {SHED_ORDER[self.shed_level - 1]}")
+            elif self.factor > self.min_factor and \
+                    any(rate * self.factor > self.min_rate for rate in self.rates.values()):
+                self.factor = max(self.min_factor, self.factor * 0.7)
+                logger.info(f"⚙️ Governor: CPU {100 * self.cpu_usage:.0f}%, "
+                            f"detection rate lowered to {100 * self.factor:.0f}%")
+        elif self.cpu_usage < self.cpu_target - self.hysteresis:
+            if self.factor < 1.0:
+                self.factor = min(1.0, self.factor / 0.7)
+                logger.info(f"⚙️ Governor: CPU {100 * self.cpu_usage:.0f}%, "
+                            f"detection rate raised to {100 * self.factor:.0f}%")
+            elif self.shed_level > 0:
+                self.shed_level -= 1
+                logger.info(f"⚙️ Governor: CPU {100 * self.cpu_usage:.0f}%, "
+                            f"resuming {SHED_ORDER[self.shed_level]}")
+
+    def delay(self, camera, state):
+        """Seconds until the next frame of 'camera' is due, wait instead of reading frames to drop."""
+        if not self.enabled:
+            return 0.0
+        with self.lock:
+            self.states[camera] = state
+            return max(0.0, min(self.next_due.get(camera, 0) - time.time(), 1.0 / self.rate(state)))
+
+    def admit(self, camera, frame_time, state):
+        """True if the frame captured at 'frame_time' is to be processed."""
+        now = time.time()
+        with self.lock:
+            self.sample(now)
+            self.states[camera] = state
+            counts = self.counts.setdefault(camera, Counter())
+            if self.enabled:
+                if now - frame_time > self.max_age:
+                    counts["stale"] += 1
+                    return False
+                if now < self.next_due.get(camera, 0):
+                    counts["rate"] += 1
+                    return False
+                # small tolerance, so capture jitter does not halve the rate
+                self.next_due[camera] = now + 0.9 / self.rate(state)
+            counts["admitted"] += 1
+            return True
+
+    def expired(self, camera, frame_time):
+        """Deadline check before work that started late (e.g. after waiting for a detection turn)."""
+        if not self.enabled or time.time() - frame_time <= self.max_age:
+            return False
+        with self.lock:
+            self.counts.setdefault(camera, Counter())["late"] += 1
+        return True
+
+    def sheds(self, work):
+        """True while the optional 'work' ("identify", "preview", "recording") is to be skipped or postponed."""
+        if not self.enabled:
+            return False
+        with self.lock:
+            self.sample(time.time())
+            return work in SHED_ORDER[:self.shed_level]
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "max_age_ms": 1000 * self.max_age,
+                "cpu_usage": self.cpu_usage,
+                "rate_factor": self.factor,
+                "min_rate": self.min_rate,
+                "shed": list(SHED_ORDER[:self.shed_level]),
+                "cameras": {camera: dict(self.counts.get(camera, {}), state=state, rate=self.rate(state))
+                            for camera, state in self.states.items()},
+            }
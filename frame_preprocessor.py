@@ -0,0 +1,58 @@
+# frame_preprocessor.py
+
+import cv2
+import numpy as np
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class FramePreprocessor:
+    """
+    Crop + resize + colour conversion of the detection frame into preallocated buffers.
+
+    The buffers are sized from the stream resolution and the DetectionRegion on
+    the first frame (and again only if the resolution changes); resize() and
+    cvtColor() write into them with dst=, so the detection loop allocates no
+    frame per iteration. The small BGR frame feeds the motion gate, the RGB
+    conversion runs only for frames that pass it and is contiguous already.
+
+    With 'buffers' > 1 the buffer sets are used in rotation, so a frame handed to
+    another consumer (e.g. queued for a recognition worker) is not overwritten
+    by the next 'buffers' - 1 frames.
+    """
+
+    def __init__(self, region, buffers=1):
+        self.region = region
+        self.count = buffers
+        self.frame_shape = None
+        self.size = None
+        self.bgr = []
+        self.rgb = []
+        self.index = 0
+
+    def allocate(self, frame_shape):
+        self.region.update_geometry(frame_shape)
+        top, right, bottom, left = self.region.pixel_rect
+        # same rounding as cv2.resize with fx/fy, so the small frame matches prepare()
+        width = max(int(round((right - left) * self.region.scale)), 1)
+        height = max(int(round((bottom - top) * self.region.scale)), 1)
+        self.size = (width, height)
+        self.bgr = [np.empty((height, width, 3), dtype=np.uint8)
+                    for _ in range(self.count)]
+        self.rgb = [np.empty((height, width, 3), dtype=np.uint8)
+                    for _ in range(self.count)]
+        self.frame_shape = frame_shape
+        logger.debug(f"Preprocessing buffers: {self.count} x {width}x{height}")
+
+    def resize(self, frame):
+        """Returns the small BGR frame of the detection region (a reused buffer)."""
+        if frame.shape != self.frame_shape:
+            self.allocate(frame.shape)
+        self.index = (self.index + 1) % self.count
+        return cv2.resize(self.region.crop(frame), self.size, dst=self.bgr[self.index])
+
+    def to_rgb(self, small_frame):
+        """RGB version of the small frame from the last resize() (a reused buffer)."""
+        return cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB, dst=self.rgb[self.index])
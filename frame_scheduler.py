@@ -0,0 +1,61 @@
+# frame_scheduler.py
+
+import threading
+
+from contextlib import contextmanager
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class FairScheduler:
+    """
+    Decides which camera gets the next recognition slot.
+
+    Higher priority wins (cameras with active proximity), among cameras of the
+    same priority the one served least recently, so a camera that always has a
+    frame ready cannot starve the others.
+
+    Used by the RecognitionPool to pick the pending frame an idle worker gets
+    and, without worker processes, as a turn lock around detection and encoding
+    in the camera threads ('slots' turns at a time).
+    """
+
+    def __init__(self, slots=1):
+        self.slots = slots
+        self.condition = threading.Condition()
+        self.busy = 0
+        self.waiting = {}       # source -> priority
+        self.last_served = {}   # source -> serve counter
+        self.served_count = 0
+
+    def choose(self, candidates):
+        """Source to serve next out of 'candidates' (dict source -> priority)."""
+        return max(candidates, key=lambda source: (candidates[source], -self.last_served.get(source, 0)))
+
+    def served(self, source):
+        self.served_count += 1
+        self.last_served[source] = self.served_count
+
+    def pick(self, candidates):
+        """choose() and mark the chosen source as served."""
+        source = self.choose(candidates)
+        self.served(source)
+        return source
+
+    @contextmanager
+    def turn(self, source, priority=0):
+        """Wait for a slot of 'source', held while the with-block runs."""
+        with self.condition:
+            self.waiting[source] = priority
+            self.condition.wait_for(
+                lambda: self.busy < self.slots and self.choose(self.waiting) == source)
+            del self.waiting[source]
+            self.served(source)
+            self.busy += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.busy -= 1
+                self.condition.notify_all()
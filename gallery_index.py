@@ -0,0 +1,250 @@
+# gallery_index.py
+
+import threading
+import numpy as np
+
+from logger_config import get_logger
+
+try:
+    from sklearn.neighbors import BallTree
+except ImportError:     # scikit-learn is optional, brute force search is always available
+    BallTree = None
+
+logger = get_logger(__name__)
+
+ENCODING_SIZE = 128
+
+
+def as_matrix(encodings):
+    """Returns encodings as a contiguous float32 (N, 128) matrix."""
+    if len(encodings) == 0:
+        return np.empty((0, ENCODING_SIZE), dtype=np.float32)
+    return np.ascontiguousarray(
+        np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE))
+
+
+def brute_force_distances(queries, gallery, gallery_sq):
+    """
+    Returns the (queries x gallery) matrix of euclidean distances.
+    """
+    # |a - b|^2 = |a|^2 + |b|^2 - 2ab, clamped against rounding below zero
+    sq = np.einsum('ij,ij->i', queries, queries)[:, None] + \
+        gallery_sq[None, :] - 2.0 * (queries @ gallery.T)
+    np.maximum(sq, 0.0, out=sq)
+    return np.sqrt(sq, out=sq)
+
+
+class BruteForceIndex:
+    """
+    Exact nearest neighbour search over one contiguous float32 matrix.
+
+    Best for small galleries (up to a few thousand encodings): a single
+    matrix product per frame. Every entry has a unique key (e.g. the image
+    path) so it can be removed or replaced later.
+    """
+
+    kind = "brute"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.encodings = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        self.sq_norms = np.empty((0,), dtype=np.float32)
+        self.names = []
+        self.keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def build(self, encodings, names, keys):
+        matrix = as_matrix(encodings)
+        with self.lock:
+            self.encodings = matrix
+            self.sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+            self.names = list(names)
+            self.keys = list(keys)
+
+    def add(self, key, encoding, name):
+        """Insert an entry, replacing an existing entry with the same key."""
+        row = as_matrix([encoding])
+        with self.lock:
+            if key in self.keys:
+                index = self.keys.index(key)
+                encodings = self.encodings.copy()
+                encodings[index] = row[0]
+                names = list(self.names)
+                names[index] = name
+                keys = self.keys
+            else:
+                encodings = np.vstack([self.encodings, row])
+                names = self.names + [name]
+                keys = self.keys + [key]
+            self.encodings = encodings
+            self.sq_norms = np.einsum('ij,ij->i', encodings, encodings)
+            self.names = names
+            self.keys = keys
+
+    def remove(self, key):
+        """Remove the entry with the given key. Returns False if it does not exist."""
+        with self.lock:
+            if key not in self.keys:
+                return False
+            index = self.keys.index(key)
+            self.encodings = np.delete(self.encodings, index, axis=0)
+            self.sq_norms = np.delete(self.sq_norms, index)
+            self.names = self.names[:index] + self.names[index + 1:]
+            self.keys = self.keys[:index] + self.keys[index + 1:]
+            return True
+
+    def query(self, queries):
+        """
+        Returns (names, distances) of the nearest entry for each query,
+        or (None, None) if the index is empty.
+        """
+        with self.lock:
+            encodings, sq_norms, names = self.encodings, self.sq_norms, self.names
+        if not names:
+            return None, None
+        dist = brute_force_distances(queries, encodings, sq_norms)
+        best = np.argmin(dist, axis=1)
+        return [names[i] for i in best], dist[np.arange(len(queries)), best]
+
+    def entries(self):
+        """Returns (encodings, names, keys) of all entries."""
+        with self.lock:
+            return self.encodings, list(self.names), list(self.keys)
+
+
+class BallTreeIndex:
+    """
+    Tree index (scikit-learn BallTree) for large galleries.
+
+    A BallTree is static, so inserts go to a small brute-force 'delta' index
+    and deletes are recorded as tombstones; queries search both and skip
+    deleted rows. The tree is rebuilt when the delta grows above
+    'rebuild_ratio' of the tree size or more than 'max_deleted' rows are
+    deleted (each tombstone adds one neighbour to every tree query).
+    """
+
+    kind = "balltree"
+
+    def __init__(self, leaf_size=40, rebuild_ratio=0.1, max_deleted=16):
+        if BallTree is None:
+            raise ImportError(
+                "scikit-learn is required for the BallTree gallery index")
+        self.leaf_size = leaf_size
+        self.rebuild_ratio = rebuild_ratio
+        self.max_deleted = max_deleted
+        self.lock = threading.Lock()
+        # serializes add/remove with the rebuild they may trigger
+        self.update_lock = threading.Lock()
+        self.tree = None
+        self.tree_encodings = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        self.tree_names = []
+        self.tree_keys = []
+        self.tree_rows = {}         # key -> row in the tree
+        self.deleted = set()        # tree rows removed since the last rebuild
+        self.delta = BruteForceIndex()
+
+    def __len__(self):
+        return len(self.tree_keys) - len(self.deleted) + len(self.delta)
+
+    def build(self, encodings, names, keys):
+        matrix = as_matrix(encodings)
+        tree = None
+        if len(matrix):
+            tree = BallTree(matrix, leaf_size=self.leaf_size)
+        with self.lock:
+            self.tree = tree
+            self.tree_encodings = matrix
+            self.tree_names = list(names)
+            self.tree_keys = list(keys)
+            self.tree_rows = {key: row
+                              for row, key in enumerate(self.tree_keys)}
+            self.deleted = set()
+            self.delta = BruteForceIndex()
+
+    def add(self, key, encoding, name):
+        with self.update_lock:
+            with self.lock:
+                self._remove_from_tree(key)
+                self.delta.add(key, encoding, name)
+            self._maybe_rebuild()
+
+    def remove(self, key):
+        with self.update_lock:
+            with self.lock:
+                removed = self._remove_from_tree(key) or self.delta.remove(key)
+            self._maybe_rebuild()
+        return removed
+
+    def _remove_from_tree(self, key):
+        row = self.tree_rows.pop(key, None)
+        if row is None:
+            return False
+        self.deleted.add(row)
+        return True
+
+    def _maybe_rebuild(self):
+        with self.lock:
+            limit = max(1, int(self.rebuild_ratio * len(self.tree_keys)))
+            if len(self.delta) <= limit and len(self.deleted) <= self.max_deleted:
+                return
+        encodings, names, keys = self.entries()
+        logger.debug(
+            f"Rebuilding BallTree gallery index ({len(keys)} entries)")
+        self.build(encodings, names, keys)
+
+    def query(self, queries):
+        with self.lock:
+            tree, tree_names = self.tree, self.tree_names
+            deleted, delta = set(self.deleted), self.delta
+
+        best_names = [None] * len(queries)
+        best_dist = np.full(len(queries), np.inf, dtype=np.float32)
+        if tree is not None and len(deleted) < len(tree_names):
+            # enough neighbours so that at least one of them is not deleted
+            k = min(len(deleted) + 1, len(tree_names))
+            dist, rows = tree.query(queries, k=k)
+            for q in range(len(queries)):
+                for d, row in zip(dist[q], rows[q]):
+                    if row not in deleted:
+                        best_names[q], best_dist[q] = tree_names[row], d
+                        break
+
+        delta_names, delta_dist = delta.query(queries)
+        if delta_names is not None:
+            for q in range(len(queries)):
+                if delta_dist[q] < best_dist[q]:
+                    best_names[q], best_dist[q] = delta_names[q], delta_dist[q]
+
+        if all(name is None for name in best_names):
+            return None, None
+        return best_names, best_dist
+
+    def entries(self):
+        with self.lock:
+            rows = [row for row in range(len(self.tree_keys))
+                    if row not in self.deleted]
+            encodings = self.tree_encodings[rows]
+            names = [self.tree_names[row] for row in rows]
+            keys = [self.tree_keys[row] for row in rows]
+            delta_encodings, delta_names, delta_keys = self.delta.entries()
+        return np.vstack([encodings, delta_encodings]), names + delta_names, keys + delta_keys
+
+
+def create_index(kind="auto", size=0, balltree_threshold=50000):
+    """
+    Returns a gallery index.
+
+    Args:
+        kind: "brute", "balltree" or "auto" (BallTree for galleries of at
+            least 'balltree_threshold' encodings, if scikit-learn is available).
+        size: expected number of encodings, used by "auto".
+    """
+    if kind == "auto":
+        kind = "balltree" if size >= balltree_threshold and BallTree is not None else "brute"
+    if kind == "balltree":
+        return BallTreeIndex()
+    if kind == "brute":
+        return BruteForceIndex()
+    raise ValueError(f"Unknown gallery index kind: {kind}")
@@ -0,0 +1,57 @@
+# gallery_watcher.py
+
+import threading
+
+from logger_config import get_logger
+
+try:
+    from watchfiles import watch
+except ImportError:     # watchfiles is optional, enrollment endpoint still works
+    watch = None
+
+logger = get_logger(__name__)
+
+
+class GalleryWatcher:
+    """
+    Watches the known faces directory and calls 'on_change' when images are
+    added, modified or removed. watchfiles groups bursts of file events
+    (e.g. a copy of several images) into one change set, so one reload
+    covers all of them.
+    """
+
+    def __init__(self, directory, on_change, extensions=(".jpg", ".jpeg", ".png")):
+        self.directory = directory
+        self.on_change = on_change
+        self.extensions = extensions
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if watch is None:
+            logger.warning(
+                "⚠️ watchfiles not installed, known faces directory is not watched.")
+            return self
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        logger.info(f"Watching '{self.directory}' for known face changes")
+        return self
+
+    def watch_filter(self, _change, path):
+        return path.lower().endswith(self.extensions)
+
+    def run(self):
+        try:
+            for changes in watch(self.directory, watch_filter=self.watch_filter,
+                                 stop_event=self.stop_event):
+                logger.info(
+                    f"Known faces changed: {sorted(path for _change, path in changes)}")
+                try:
+                    self.on_change()
+                except Exception as e:
+                    logger.error(f"Failed to update known faces: {e}")
+        except Exception as e:
+            logger.error(f"Known faces watcher stopped: {e}")
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,187 @@
+# identify_service.py
+
+import time
+import queue
+import struct
+import threading
+import cv2
+import numpy as np
+
+from concurrent.futures import Future
+from face_detectors import create_detector
+from gallery_index import ENCODING_SIZE
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def image_size(data):
+    """(width, height) from the header of a JPEG or PNG image, None for other or truncated data."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] != b"\xff\xd8":
+        return None
+    offset = 2
+    while offset + 9 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1     # fill byte
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            offset += 2     # marker without a segment
+            continue
+        # start of frame (not DHT, JPG, DAC), with the image height and width
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + struct.unpack(">H", data[offset + 2:offset + 4])[0]
+    return None
+
+
+class IdentifyService:
+    """
+    Face identification for other systems of the house (POST /identify), with
+    the models and the gallery already loaded in the face process.
+
+    Images of concurrent requests are collected into micro-batches: after the
+    first image the batch thread waits at most 'max_wait' seconds for more, up
+    to 'max_batch' images. Faces are detected on each image (downscaled to
+    'max_image_size' on the longer side) and encoded from full resolution
+    crops, then the encodings of the whole batch are matched against the
+    gallery in one index query.
+    Uploads are limited to 'max_bytes' per image (checked by the endpoint),
+    JPEG or PNG images of more than 'max_pixels' are not decoded.
+    While the callable 'shed' returns True (e.g. the frame governor sheds
+    "identify" because the CPU is short), new requests are refused.
+    """
+
+    def __init__(self, matcher, detector_kind="hog", max_batch=16, max_wait=0.005, max_image_size=800,
+                 queue_size=64, max_bytes=8 * 1024 * 1024, max_pixels=4096 * 4096, padding=0.5,
+                 max_face_size=200, shed=None):
+        self.matcher = matcher
+        self.detector_kind = detector_kind
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_image_size = max_image_size
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.padding = padding
+        self.max_face_size = max_face_size
+        self.shed = shed
+        self.requests = queue.Queue(maxsize=queue_size)
+        self.submit_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def submit(self, jpegs):
+        """
+        Queue the encoded images of one request, returns a Future of each result.
+        Raises queue.Full, with none of them queued, if they do not all fit
+        or the identification is shed.
+        """
+        if self.shed is not None and self.shed():
+            raise queue.Full
+        with self.submit_lock:
+            # only the batch thread takes images out meanwhile, the room can only grow
+            if self.requests.maxsize - self.requests.qsize() < len(jpegs):
+                raise queue.Full
+            futures = []
+            for jpeg in jpegs:
+                future = Future()
+                self.requests.put_nowait((jpeg, future))
+                futures.append(future)
+        return futures
+
+    def decode(self, jpeg):
+        """BGR image, None if it cannot be decoded; raises ValueError if it has too many pixels."""
+        if not jpeg:
+            return None
+        size = image_size(jpeg)
+        if size is not None and size[0] * size[1] > self.max_pixels:
+            raise ValueError(f"{size[0]}x{size[1]} image")
+        return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def run(self):
+        detector = create_detector(self.detector_kind)
+        while self.running:
+            try:
+                batch = [self.requests.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            deadline = time.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.process(batch, detector)
+            except Exception as e:
+                logger.error(f"Error during face identification: {e}")
+                for _jpeg, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def detect(self, frame, detector):
+        """Face boxes of a BGR image in its own coordinates, detected on a downscaled copy."""
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.max_image_size / float(max(height, width)))
+        small = frame
+        if scale < 1.0:
+            small = cv2.resize(frame, (0, 0), fx=scale, fy=scale,
+                               interpolation=cv2.INTER_AREA)
+        boxes = detector.detect(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+        return [tuple(int(value / scale) for value in box) for box in boxes]
+
+    def process(self, batch, detector):
+        start = time.perf_counter()
+        faces = []      # boxes per image, an error message if it is not processed
+        encodings = []
+        for jpeg, _future in batch:
+            try:
+                frame = self.decode(jpeg)
+            except ValueError:
+                faces.append("Image too large")
+                continue
+            if frame is None:
+                faces.append("Cannot decode image")
+                continue
+            boxes = self.detect(frame, detector)
+            faces.append(boxes)
+            encodings.append(self.matcher.encode_crops(
+                frame, boxes, self.padding, self.max_face_size))
+
+        # all faces of the batch in one gallery query
+        if encodings:
+            encodings = np.vstack(encodings)
+        else:
+            encodings = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        matches = iter(self.matcher.match(encodings))
+        for (_jpeg, future), boxes in zip(batch, faces):
+            if isinstance(boxes, str):
+                future.set_result({"error": boxes})
+                continue
+            results = []
+            for box in boxes:
+                name, distance = next(matches)
+                results.append(
+                    {"box": list(box), "name": name, "distance": distance})
+            future.set_result({"faces": results})
+        logger.debug(f"Identify batch: {len(batch)} images, {len(encodings)} faces "
+                     f"in {1000 * (time.perf_counter() - start):.0f} ms")
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
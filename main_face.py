@@ -4,18 +4,34 @@ documentation: https://face-recognition.readthedocs.io/en/latest/?badge=latest
 import os
 import cv2
 import time
-import numpy as np
 import signal
 import threading
 import multiprocessing
-import face_recognition
 import proximity_server  # Import FastAPI module
 
 from helper import *
 from config import *
 from controller import Controller
-from queue import Queue
-from collections import deque
+from face_matcher import FaceMatcher, UNKNOWN_NAME, warm_up_models
+from face_detectors import create_detector
+from face_gallery import GalleryCache
+from motion_gate import MotionGate
+from face_tracker import FaceTracker
+from face_quality import FaceQuality, BestFaceSelector
+from recognition_pool import RecognitionPool, CropSource, CropFrame, FrameStats
+from frame_scheduler import FairScheduler
+from frame_governor import FrameGovernor
+from shared_capture import CaptureProcess
+from dual_stream import OnDemandStream, map_box
+from preroll_buffer import PrerollBuffer
+from clip_recorder import ClipRecorder, SegmentRemuxer
+from detection_region import DetectionRegion
+from frame_preprocessor import FramePreprocessor
+from gallery_watcher import GalleryWatcher
+from vote_filter import VoteFilter
+from unknown_visitors import UnknownVisitorStore
+from identify_service import IdentifyService
+from preview import LatestMailbox, annotate_frame, mjpeg_preview
 from logger_config import get_logger, setup_queue_listener, log_queue
 
 _listener = None
@@ -28,8 +44,15 @@ logger = get_logger(__name__)
     False   Idle CPU = 13-14%
         - proximity set activity inside thread start_face_recognition()
         - higher power consumption but faster reaction on proximity signal
+    CONFIG_WARM_STANDBY (only with CONFIG_START_PROXIMITY_THD = False)
+    True    warm standby
+        - RTSP stream stays open, frames are only grabbed (no retrieve/convert, no detection)
+        - dlib models preloaded and warmed up with a dummy inference at start
+        - proximity heartbeat wakes the loop immediately, next grabbed frame is processed
+        - time from proximity ON to first frame / first face is logged
 """
 CONFIG_START_PROXIMITY_THD = False
+CONFIG_WARM_STANDBY = True
 # Allow display screen and show frames
 CONFIG_ALLOW_DISPLAY_GUI = False
 # Pause time after face was recognized to start next detection
@@ -42,8 +65,8 @@ os.environ["QT_QPA_PLATFORM"] = "xcb"
 # Suppress FFmpeg logging
 os.environ["OPENCV_FFMPEG_DEBUG"] = "0"
 
-# Send frames from handle_face_detection() to display_gui()
-frame_queue = Queue()
+# Send the latest frame from handle_face_detection() to display_gui(), one slot only
+preview_mailbox = LatestMailbox()
 # Create a threading event for shutdown
 shutdown_event = threading.Event()
 # Multiprocessing Event from main(), delay for next recognition until sip disconnected
@@ -53,8 +76,12 @@ sip_connection_active = False
 
 # Track the active face recognition thread
 face_recognition_thread = None
-# Track if face recognition is running
-face_recognition_running = False
+# Frame deadline and detection rate of all cameras, adapted to the CPU usage
+frame_governor = FrameGovernor(max_age=FRAME_MAX_AGE_MS / 1000.0, rates=GOVERNOR_RATES,
+                               cpu_target=GOVERNOR_CPU_TARGET, min_factor=GOVERNOR_MIN_RATE_FACTOR,
+                               min_rate=GOVERNOR_MIN_RATE, enabled=GOVERNOR_ENABLED)
+# Recognition worker pool shared by all cameras (None = detection in the camera threads)
+recognition_pool = None
 
 
 def signal_handler(sig, frame):
@@ -63,93 +90,74 @@ def signal_handler(sig, frame):
 
 
 signal.signal(signal.SIGINT, signal_handler)
+# main.py stops the face process with terminate()
+signal.signal(signal.SIGTERM, signal_handler)
 
 # first_detection = True
-###############################################
-# Global state for face detection filtering
-detection_lock = threading.Lock()
-last_face_name = None
-detection_count = 0
-first_detection_time = None
-last_event_time = None
-pause_until = 0
-###############################################
 
-# Buffer for saving previous frames
-frame_buffer = deque(maxlen=30)  # Store last 30 frames
 
-
-def on_face_detected(frame, recognized_name):
+def on_face_detected(camera, frame, recognized_names, track_ids=None, encodings=None, fresh=None):
     """
-    This function is called each time a face is detected.
-    It applies a simple filter so that an event is only accepted
-    if the same recognized name is received consecutively 5 times
-    within 1200 milliseconds. If no event occurs for 500ms, the counter resets.
-    Once an event is accepted, the counter is cleared and the function pauses for 'CONFIG_PAUSE_TIME' seconds.
-    After that, a new thread is spawned to handle the accepted event (e.g. capturing a picture
-    and sending an HTTP command if the recognized face is known).
+    This function is called once per processed frame of 'camera' with the names of all faces
+    detected in it ('track_ids' are the matching FaceTracker track ids, 'encodings'
+    their last encodings, used to tell unknown visitors apart).
+    Only names encoded on this frame ('fresh', None = all) vote: a name the tracker
+    reuses between encodings is not a new recognition.
+    The vote filter accepts an identity only if it was recognized 'VOTE_HITS' times
+    within 'VOTE_WINDOW' seconds, each identity with its own window, so one visitor
+    does not reset the count of another (each camera has its own filter). After acceptance
+    that identity is paused for 'CONFIG_PAUSE_TIME' seconds.
+    For every accepted identity a new thread is spawned to handle the event (e.g. capturing
+    a clip and sending an HTTP command if the recognized face is known).
+    Faces not identified yet (name None, e.g. skipped by the quality gate) do not vote.
     """
-    global last_face_name, detection_count, first_detection_time, last_event_time, pause_until
-    global frame_buffer
-
     current_time = time.time()
-    with detection_lock:
-        # If we're in a forced pause period, do nothing.
-        if current_time < pause_until:
-            return
-
-        # If more than 0.5 sec passed since last event, reset counter.
-        if last_event_time is None or (current_time - last_event_time) > 0.5:
-            detection_count = 0
-            first_detection_time = current_time
-            last_face_name = recognized_name
-
-        # If same name as previous event, increment; otherwise, reset.
-        if recognized_name == last_face_name:
-            detection_count += 1
-        else:
-            detection_count = 1
-            first_detection_time = current_time
-            last_face_name = recognized_name
-
-        last_event_time = current_time
-
-        # Store frame in buffer
-        frame_buffer.append(frame.copy())
-
-        # Check if we have 5 consecutive events within 1.2 seconds.
-        if detection_count >= 5 and (current_time - first_detection_time) <= 1.2:
-            # Clear the counter and set a pause of 5 seconds.
-            detection_count = 0
-            first_detection_time = None
-            last_event_time = None
-            pause_until = current_time + CONFIG_PAUSE_TIME  # x-seconds pause
-            # Start a new thread to handle the accepted event.
-            threading.Thread(target=handle_accepted_event, args=(
-                recognized_name,), daemon=True).start()
-
-
-def handle_accepted_event(recognized_name):
+    votes = recognized_names
+    if fresh is not None:
+        votes = [name if is_fresh else None
+                 for name, is_fresh in zip(recognized_names, fresh)]
+    for recognized_name in camera.vote_filter.update(votes, current_time):
+        unknown_encodings = None
+        if recognized_name == UNKNOWN_NAME and encodings is not None:
+            unknown_encodings = [encoding for name, encoding in zip(recognized_names, encodings)
+                                 if name == UNKNOWN_NAME and encoding is not None]
+        # Start a new thread to handle the accepted event, with the best face image of the visit.
+        snapshot = camera.best_faces.take(recognized_name)
+        threading.Thread(target=handle_accepted_event, args=(
+            camera, recognized_name, current_time, snapshot,
+            unknown_encodings), daemon=True).start()
+
+
+def handle_accepted_event(camera, recognized_name, event_time, snapshot=None, unknown_encodings=None):
     doorbell = Controller(None)
-    global face_recognition_running
     global sip_connection_active
-    global frame_buffer
     """
-    This function is started in a new thread when a face detection event is accepted.
+    This function is started in a new thread when a face detection event of 'camera' is accepted.
     It is responsible for taking a picture (you may integrate the actual capture logic)
-    and, if the recognized face is not "Unknown", sending an HTTP command to open the door.
+    and, if the recognized face is not "Unknown", sending an HTTP command to open the door
+    (the relay of the camera, if it has one).
+    'snapshot' is the best face crop of the event (BGR), saved with the clip.
+    'unknown_encodings' of an Unknown event assign it to a recurring unknown visitor,
+    whose id is added to the clip name.
     """
 
     # If the recognized name is known, send an HTTP command.
-    if recognized_name != "Unknown":
-        doorbell.doorbell_relay(1)
-
-    logger.info(f"Recognized face: {recognized_name}")
-    save_video(list(frame_buffer), recognized_name)
-    frame_buffer.clear()  # Clear buffer after saving
-
-    # after finishing this event clear flags
-    face_recognition_running = False
+    if recognized_name != UNKNOWN_NAME and camera.relay is not None:
+        doorbell.doorbell_relay(camera.relay)
+
+    logger.info(f"Recognized face: {recognized_name} ({camera.name})")
+    event_name = recognized_name
+    if unknown_encodings:
+        visitor_id, count = unknown_visitors.add(
+            unknown_encodings, event_time, snapshot)
+        event_name = f"{UNKNOWN_NAME}_{visitor_id}"
+        logger.info(f"👤 Unknown visitor {visitor_id}, seen {count} times")
+    # Clip of the seconds before and after the event, written in the background
+    camera.clip_recorder.record(
+        camera.event_prefix + event_name, event_time, snapshot)
+
+    # Detection keeps running: only the accepted identity is paused (vote filter), so the
+    # other people of a group can still be accepted
     sip_connection_active = False
 
 ##################################################################
@@ -157,43 +165,95 @@ def handle_accepted_event(recognized_name):
 ##################################################################
 
 
-# Load known face encodings and names from the "known_faces" directory.
-known_face_encodings = []
-known_face_names = []
+# Face quality gate in front of encoding, also scores the event snapshot candidates
+face_quality = FaceQuality(min_size=QUALITY_MIN_FACE_SIZE, min_sharpness=QUALITY_MIN_SHARPNESS,
+                           max_yaw=QUALITY_MAX_YAW, enabled=QUALITY_GATE_ENABLED)
+# Recurring unknown faces, clustered incrementally into pseudo-identities
+unknown_visitors = UnknownVisitorStore(UNKNOWN_VISITORS_PATH, threshold=UNKNOWN_VISITOR_THRESHOLD,
+                                       max_visitors=UNKNOWN_VISITORS_MAX)
+
+# Known faces gallery, all faces of a frame are matched in one index query.
+face_matcher = FaceMatcher(tolerance=0.6, index_kind=GALLERY_INDEX,
+                           balltree_threshold=GALLERY_BALLTREE_THRESHOLD)
+
+
+# POST /identify for other systems, micro-batched on the same models and gallery
+identify_service = IdentifyService(face_matcher, detector_kind=FACE_DETECTOR, max_batch=IDENTIFY_MAX_BATCH,
+                                   max_wait=IDENTIFY_MAX_WAIT_MS / 1000.0,
+                                   max_image_size=IDENTIFY_MAX_IMAGE_SIZE, queue_size=IDENTIFY_QUEUE_SIZE,
+                                   max_bytes=IDENTIFY_MAX_BYTES, max_pixels=IDENTIFY_MAX_PIXELS,
+                                   padding=ENCODE_CROP_PADDING, max_face_size=ENCODE_MAX_FACE_SIZE,
+                                   shed=lambda: frame_governor.sheds("identify"))
+
+gallery_cache = GalleryCache(
+    SYS_GALLERY_CACHE_PATH, workers=GALLERY_ENCODE_WORKERS)
+# Serializes gallery reloads from startup, directory watcher and enrollment endpoint
+gallery_lock = threading.Lock()
+
 
+def load_known_faces(known_faces_dir=SYS_KNOWN_FACES_PATH):
+    """
+    Load known face encodings and names from the "known_faces" directory.
+    Encodings are taken from the gallery cache; only new or changed images are encoded.
+    Called again on every change of the directory: only the changed and removed
+    images are updated in the gallery (and in the recognition workers) while
+    recognition keeps running.
 
-def load_known_faces(known_faces_dir="known_faces"):
+    Returns the list of known names.
+    """
     if not os.path.isdir(known_faces_dir):
         logger.error(
             f"Directory '{known_faces_dir}' not found. No known faces loaded.")
-        return
-
-    for filename in os.listdir(known_faces_dir):
-        filepath = os.path.join(known_faces_dir, filename)
-        # Only process image files (you can adjust the extensions as needed)
-        if os.path.splitext(filename)[1].lower() not in [".jpg", ".jpeg", ".png"]:
-            continue
-        image = face_recognition.load_image_file(filepath)
-        encodings = face_recognition.face_encodings(image)
-        if len(encodings) > 0:
-            known_face_encodings.append(encodings[0])
-            # Use filename without extension as the person's name
-            known_face_names.append(os.path.splitext(filename)[0])
-            logger.info(f"Loaded face: {os.path.splitext(filename)[0]}")
+        return []
+
+    with gallery_lock:
+        known_face_encodings, known_face_names, known_face_keys, changes = gallery_cache.sync(
+            known_faces_dir)
+        if changes is None:
+            face_matcher.set_gallery(
+                known_face_encodings, known_face_names, known_face_keys)
         else:
-            logger.warning(f"No face found in {filename}")
+            changed, removed = changes
+            for key in removed:
+                face_matcher.remove(key)
+            for key, encoding, name in changed:
+                face_matcher.add(key, encoding, name)
+            if changed or removed:
+                logger.info(
+                    f"Face gallery updated: {len(changed)} added or changed, {len(removed)} removed")
+    return known_face_names
 
 
 load_known_faces()  # Load known faces at startup
 
 
 class VideoCaptureThread:
-    def __init__(self, src):
+    """
+    Reads the RTSP stream in a background thread and hands the latest frame over
+    to the consumer together with its sequence number and capture timestamp.
+
+    Every packet is grabbed to keep up with the stream, but a frame is retrieved
+    (converted to BGR) only while a consumer is waiting for it in read_next(),
+    so frames nobody will read are never converted or copied. Frames due for the
+    pre-roll ring are retrieved at its own rate and stored JPEG-compressed. A published frame
+    is never modified by the capture thread (each retrieve() allocates a new
+    array), so it is handed over by reference, without a copy.
+    """
+
+    def __init__(self, src, max_age=0.1, preroll=None):
         self.cap = cv2.VideoCapture(src)
+        self.preroll = preroll
         # Read the first frame
         self.grabbed, self.frame = self.cap.read()
+        self.seq = 1 if self.grabbed else 0
+        self.timestamp = time.time()
+        # A published frame older than this is not handed over, a new one is awaited
+        self.max_age = max_age
         self.running = True
         self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+        self.waiting = 0
+        self.grabbed_count = 0
         self.thread = None
 
     def start(self):
@@ -203,54 +263,624 @@ class VideoCaptureThread:
 
     def update(self):
         while self.running and not shutdown_event.is_set():
-            ret, frame = self.cap.read()
-            if not ret:
+            if not self.cap.grab():
+                time.sleep(0.01)
                 continue  # In a live stream, wait for the next frame
+            timestamp = time.time()
+            self.grabbed_count += 1
             with self.lock:
-                self.grabbed = ret
-                self.frame = frame
-
-    def read(self):
-        with self.lock:
-            return self.frame.copy() if self.frame is not None else None
+                wanted = self.waiting > 0
+            preroll_due = (self.preroll is not None
+                           and self.preroll.due(timestamp))
+            if not wanted and not preroll_due:
+                continue
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                continue
+            if preroll_due:
+                self.preroll.add(timestamp, frame)
+            self.publish(timestamp, frame)
+
+    def publish(self, timestamp, frame):
+        """Make a retrieved frame the latest one and wake up waiting consumers."""
+        with self.new_frame:
+            self.grabbed = True
+            self.frame = frame
+            self.timestamp = timestamp
+            self.seq += 1
+            self.new_frame.notify_all()
+
+    def read_next(self, last_seq=0, timeout=1.0):
+        """
+        Returns (seq, timestamp, frame) of a frame newer than 'last_seq', waiting
+        up to 'timeout' seconds for it. 'frame' is None on timeout.
+        The frame is shared, not copied: consumers must not draw into it.
+        """
+        with self.new_frame:
+            if self.seq <= last_seq or time.time() - self.timestamp > self.max_age:
+                newer_than = self.seq
+                self.waiting += 1
+                try:
+                    self.new_frame.wait_for(
+                        lambda: self.seq > newer_than or not self.running, timeout)
+                finally:
+                    self.waiting -= 1
+            if self.seq <= last_seq or self.frame is None:
+                return last_seq, None, None
+            return self.seq, self.timestamp, self.frame
+
+    def frame_near(self, timestamp, max_skew):
+        """
+        Returns (seq, timestamp, frame) of the latest frame, frame None if it was not
+        captured within 'max_skew' seconds of 'timestamp'.
+        """
+        seq, frame_time, frame = self.read_next(0, max_skew)
+        if frame is None or abs(frame_time - timestamp) > max_skew:
+            return 0, None, None
+        return seq, frame_time, frame
+
+    def valid(self, seq):
+        """Published frames are never reused, so they stay valid."""
+        return True
 
     def stop(self):
         self.running = False
+        with self.new_frame:
+            self.new_frame.notify_all()
         if self.thread is not None:
             self.thread.join()
         self.cap.release()
 
-# def handle_face_detection(frame_queue):
+
+class WakeupTimer:
+    """
+    Time from proximity ON to the first processed frame and to the first detected face.
+    """
+
+    def __init__(self):
+        self.since = None
+        self.frame_pending = False
+        self.face_pending = False
+
+    def start(self, since):
+        self.since = since
+        self.frame_pending = True
+        self.face_pending = True
+
+    def stop(self):
+        if self.face_pending and self.since is not None:
+            logger.info(
+                f"⏱️ No face detected during proximity ({time.time() - self.since:.1f} s)")
+        self.frame_pending = False
+        self.face_pending = False
+
+    def frame_processed(self, face_count):
+        if self.frame_pending:
+            self.frame_pending = False
+            logger.info(
+                f"⏱️ Time to first frame: {1000 * (time.time() - self.since):.0f} ms")
+        if self.face_pending and face_count:
+            self.face_pending = False
+            logger.info(
+                f"⏱️ Time to first detection: {1000 * (time.time() - self.since):.0f} ms")
+
+
+def call_active():
+    """True while a SIP call is connected."""
+    return sip_event_connected is not None and sip_event_connected.is_set()
+
+
+def preview_wanted(camera):
+    """Annotated frames of 'camera' are wanted by a GUI or /preview.mjpeg client, and not shed."""
+    return camera.preview and (CONFIG_ALLOW_DISPLAY_GUI or mjpeg_preview.has_clients()) and \
+        not frame_governor.sheds("preview")
+
+
+def wake_face_recognition(active, sensor=None):
+    """Proximity callback in warm standby: wake the detection loops of the cameras bound to 'sensor'."""
+    for camera in cameras:
+        if sensor is None or camera.proximity == sensor:
+            camera.wakeup.set()
+
+
+def publish_faces(camera, frame, small_face_locations, tracks, qualities=None, seq=None, main=None):
+    """
+    Pass the faces of one frame of 'camera' to the detection filter and to the GUI.
+    'tracks' is None if the recognition of this frame failed.
+    'seq' is the capture seq of 'frame': a frame already overwritten in the capture
+    ring is not sent to the GUI.
+    'qualities' (QualityScore per face) select the best face crop of each identity,
+    cut in dual-stream mode from the main stream frame 'main' captured with 'frame'
+    (see Camera.main_frame) while it is still valid.
+    Face locations are mapped from detection space to full frame space with the camera region.
+    """
+    region = camera.detection_region
+    if tracks is None:
+        face_names = ["Error"] * len(small_face_locations)
+        track_ids = [None] * len(small_face_locations)
+        encodings = None
+        fresh = None
+    else:
+        face_names = [track.name for track in tracks]
+        track_ids = [track.track_id for track in tracks]
+        encodings = [track.encoding for track in tracks]
+        fresh = [track.fresh for track in tracks]
+        if qualities is not None:
+            for name, box, quality in zip(face_names, small_face_locations, qualities):
+                if name is None or not camera.best_faces.better(name, quality.score):
+                    continue
+                source, source_box = frame, region.to_frame(box)
+                if main is not None and camera.main_stream.valid(main[0], main[1]):
+                    main_frame = main[3]
+                    source, source_box = main_frame, map_box(
+                        source_box, frame.shape, main_frame.shape)
+                camera.best_faces.offer(
+                    name, quality.score, source, source_box)
+
+    # Invoke the filtering callback once with all faces of the frame.
+    on_face_detected(camera, frame, face_names, track_ids, encodings, fresh)
+
+    if preview_wanted(camera) and (seq is None or camera.capture.valid(seq)):
+        # Send frame, face locations (full frame) and face names to the GUI (Main Thread),
+        # replacing the previous frame if it was not rendered yet
+        face_locations = [region.to_frame(box) for box in small_face_locations]
+        preview_mailbox.put(
+            (frame, face_locations, [name or "?" for name in face_names]))
+
+
+def open_capture(url, ring_name, preroll=None):
+    """Start the capture of one stream, in its own process or in a thread."""
+    if CAPTURE_PROCESS_ENABLED:
+        # Decoding runs in its own process, frames are read from shared memory
+        return CaptureProcess(url, ring_name, slots=CAPTURE_RING_SLOTS, preroll=preroll).start()
+    return VideoCaptureThread(url, preroll=preroll).start()
+
+
+class Camera:
+    """
+    One camera source of the face process (an entry of CAMERAS in config.py).
+
+    Each camera has its own capture, proximity sensor binding, detection region,
+    motion gate, tracker, vote filter, best face crops and event clips, and runs
+    its detection loop in its own thread. The loaded models, the gallery and the
+    recognition worker pool are shared; a FairScheduler gives the next worker
+    (or, without workers, the next in-thread detection turn) to cameras with
+    active proximity first and to the others in turn.
+    A camera without a proximity sensor ('proximity' None) detects all the time,
+    behind its motion gate, at the lowest priority.
+    """
+
+    def __init__(self, name, url, sub_url=None, proximity=None, roi=None, relay=None,
+                 preview=False, event_prefix=""):
+        self.name = name
+        self.url = url
+        self.sub_url = sub_url
+        self.proximity = proximity
+        self.roi = roi
+        self.relay = relay
+        self.preview = preview
+        self.event_prefix = event_prefix
+        self.ring_name = f"{CAPTURE_RING_NAME}_{name}"
+        # Set by the proximity heartbeat to wake the detection loop in warm standby
+        self.wakeup = threading.Event()
+        # Face detection filter, one sliding window of votes per identity
+        self.vote_filter = VoteFilter(hits=VOTE_HITS, window=VOTE_WINDOW, pause=CONFIG_PAUSE_TIME,
+                                      reset_gap=VOTE_RESET_GAP)
+        # Best face crop per identity until its event is accepted
+        self.best_faces = BestFaceSelector(margin=EVENT_SNAPSHOT_MARGIN)
+        # JPEG pre-roll of the camera stream for event clips, fed by the capture thread
+        self.preroll_buffer = PrerollBuffer(seconds=PREROLL_SECONDS + POSTROLL_SECONDS, fps=PREROLL_FPS,
+                                            memory_budget=PREROLL_MEMORY_MB * 1024 * 1024,
+                                            jpeg_quality=PREROLL_JPEG_QUALITY)
+        # Background writer of event clips (encoded from the pre-roll ring or remuxed H.264)
+        self.clip_recorder = ClipRecorder(
+            self.preroll_buffer, mode=RECORDER_MODE, queue_size=RECORDER_QUEUE_SIZE,
+            before=PREROLL_SECONDS, after=POSTROLL_SECONDS,
+            remuxer=SegmentRemuxer(url, os.path.join(REMUX_SEGMENT_PATH, name),
+                                   segment_seconds=REMUX_SEGMENT_SECONDS,
+                                   keep_seconds=PREROLL_SECONDS + POSTROLL_SECONDS + 10),
+            defer=lambda: frame_governor.sheds("recording"), max_defer=CLIP_MAX_DEFER)
+        # Processed frames and their age (capture to decision)
+        self.stats = FrameStats()
+        self.proximity_active = False
+        # Process frames (cleared after an accepted event until the proximity changes)
+        self.running = False
+        self.capture = None
+        self.main_stream = None
+        self.main_opens = 0
+        self.preroll = None
+        self.detection_region = None
+
+    def is_proximity_active(self):
+        if self.proximity is None:
+            return True
+        return proximity_server.is_proximity_active(self.proximity)
+
+    def proximity_since(self):
+        if self.proximity is None:
+            return time.time()
+        return proximity_server.proximity_started(self.proximity)
+
+    def priority(self):
+        """Scheduling priority: cameras whose proximity sensor is active come first."""
+        return 1 if self.proximity is not None and self.proximity_active else 0
+
+    def open(self, set_active):
+        """Start the capture(s) and set up the detection state, before run()."""
+        self.proximity_active = set_active
+        self.running = set_active
+        self.preroll_buffer.enabled = self.proximity_active or not PREROLL_ONLY_ON_PROXIMITY
+        # The pre-roll ring is not needed when clips are remuxed from the original stream
+        self.preroll = self.preroll_buffer if self.clip_recorder.mode == "encode" else None
+        detection_scale = DETECTION_SCALE
+        if DUAL_STREAM_ENABLED and self.sub_url:
+            # Detect on the substream; the main stream is opened only around proximity,
+            # for full resolution face crops and the clip pre-roll.
+            self.main_stream = OnDemandStream(
+                self.open_main_stream, f"{self.name} main stream").start()
+            self.capture = open_capture(self.sub_url, self.ring_name)
+            detection_scale = DUAL_STREAM_DETECTION_SCALE
+        else:
+            self.capture = open_capture(self.url, self.ring_name, self.preroll)
+        self.motion_gate = MotionGate(threshold=MOTION_GATE_THRESHOLD, min_area=MOTION_GATE_MIN_AREA,
+                                      region=MOTION_GATE_REGION, hold_time=MOTION_GATE_HOLD_TIME)
+        self.detection_region = DetectionRegion(
+            self.roi, scale=detection_scale)
+        # Reused small frame buffers; with workers a frame may still be queued while the next ones come
+        self.preprocessor = FramePreprocessor(
+            self.detection_region, buffers=RECOGNITION_WORKERS + 2 if RECOGNITION_WORKERS > 0 else 1)
+        self.face_tracker = FaceTracker(**self.tracking())
+        self.wakeup_timer = WakeupTimer()
+
+    @staticmethod
+    def tracking():
+        """FaceTracker arguments, for the tracker of a camera and of the recognition workers."""
+        return dict(reencode_interval=TRACKER_REENCODE_INTERVAL,
+                    reencode_iou=TRACKER_REENCODE_IOU, confirm_hits=VOTE_HITS)
+
+    def open_main_stream(self):
+        # a new ring per opening, workers may still have the ring of the last one attached
+        self.main_opens += 1
+        return open_capture(self.url, f"{self.ring_name}_main{self.main_opens}", self.preroll)
+
+    def crop_source(self):
+        """Full resolution frames of this camera for two-stage encoding in the workers."""
+        return CropSource(self.ring_name, self.detection_region, ENCODE_CROP_PADDING, ENCODE_MAX_FACE_SIZE)
+
+    def main_frame(self, frame_time):
+        """
+        Main stream frame for the face crops of the substream frame captured at
+        'frame_time', as (capture, seq, timestamp, frame); None in single stream
+        mode, while the main stream is closed or has no frame close enough.
+        """
+        if self.main_stream is None:
+            return None
+        return self.main_stream.frame_near(frame_time, DUAL_STREAM_MAX_SKEW)
+
+    def crop_frame(self, frame_seq, frame_time, frame, main):
+        """CropFrame of a frame for the workers: the main stream frame 'main' if any, else the frame itself."""
+        if not TWO_STAGE_ENCODING or not CAPTURE_PROCESS_ENABLED:
+            return None
+        if main is not None:
+            capture, main_seq, main_time, _main_frame = main
+            return CropFrame(capture.ring_name, main_seq, main_time, frame.shape)
+        return CropFrame(self.ring_name, frame_seq, frame_time, frame.shape)
+
+    def run(self, recognition_pool=None, scheduler=None, face_detector=None):
+        """
+        Detection loop of the camera. Frames go to the shared 'recognition_pool',
+        or, without workers, are detected here with 'face_detector' during the
+        turns granted by 'scheduler'.
+        """
+        if self.proximity_active:
+            self.wakeup_timer.start(self.proximity_since())
+        frame_seq = 0
+
+        while not shutdown_event.is_set() and (not CONFIG_START_PROXIMITY_THD or self.running):
+            if self.proximity_active != self.is_proximity_active():
+                self.proximity_active = self.is_proximity_active()
+                # it is set if Proximity ON and clear if Proximity OFF
+                self.running = self.proximity_active
+                self.preroll_buffer.enabled = self.proximity_active or not PREROLL_ONLY_ON_PROXIMITY
+                self.motion_gate.reset()
+                self.face_tracker.reset()
+                if recognition_pool is not None:
+                    recognition_pool.reset_tracks(self.name)
+                self.best_faces.reset()
+                if self.proximity_active:
+                    self.wakeup_timer.start(self.proximity_since())
+                else:
+                    self.wakeup_timer.stop()
+                # logger.debug(f"[261] 🔴🔵 Face recognition, change running:{self.running}")
+
+            if self.main_stream is not None:
+                # stays open for the post-roll of an accepted event
+                preroll_wanted = (self.preroll is not None
+                                  and self.preroll_buffer.enabled)
+                self.main_stream.want(self.proximity_active or preroll_wanted,
+                                      self.preroll_buffer.hold_until)
+
+            if self.running:
+                # Pace the frames by the governor: wait for the next slot of this camera
+                # instead of reading frames only to drop them, drop frames past the deadline
+                state = frame_governor.state(self.priority() > 0,
+                                             call_active())
+                delay = frame_governor.delay(self.name, state)
+                self.wait_for_slot(delay, recognition_pool)
+                # fewer pre-roll JPEGs while clip encoding is shed
+                shed = frame_governor.sheds("recording")
+                self.preroll_buffer.interval_scale = \
+                    GOVERNOR_PREROLL_SCALE if shed else 1.0
+                frame_seq, frame_time, frame = self.capture.read_next(
+                    frame_seq)
+                if frame is None or not frame_governor.admit(self.name, frame_time, state):
+                    continue
+
+                # Crop to the detection region and resize for faster processing
+                small_frame = self.preprocessor.resize(frame)
+                # Skip detection if nothing moves in front of the camera
+                if MOTION_GATE_ENABLED and not self.motion_gate.check(small_frame):
+                    if preview_wanted(self):
+                        preview_mailbox.put((frame, [], []))
+                    continue
+                # Convert from BGR to RGB (into a reused, contiguous buffer)
+                small_rgb_frame = self.preprocessor.to_rgb(small_frame)
+                # Dual-stream mode: faces are encoded (and snapshots cut) from the main stream frame
+                main = self.main_frame(frame_time)
+
+                # Detect faces.
+                """ another way, one by one
+                small_face_locations = face_recognition.face_locations(
+                    small_rgb_frame, number_of_times_to_upsample=1, model='hog'
+                )
+
+                # Compute face encodings for each detected face
+                small_face_encodings = []
+                face_names = []        #
+                for face_location in small_face_locations:
+                    try:
+                        # Use the basic usage as in the docs: pass image and a list containing the location
+                        encoding = face_recognition.face_encodings(small_rgb_frame, [face_location])[0]
+                        small_face_encodings.append(encoding)
+                    except Exception as e:
+                        logger.error(f"Error computing encoding for face at {face_location}: {e}")
+                        small_face_encodings.append(None)
+                """
+
+                if recognition_pool is None:
+                    # One camera at a time detects and encodes, the models are shared
+                    with scheduler.turn(self.name, self.priority()):
+                        # the turn comes late when the other cameras keep the detector busy
+                        if frame_governor.expired(self.name, frame_time):
+                            continue
+                        self.detect_in_thread(
+                            frame_seq, frame, small_rgb_frame, face_detector, main)
+                    self.stats.add(time.time() - frame_time)
+                else:
+                    # Detection, encoding and matching run in the worker processes,
+                    # the frame is dropped if a newer one arrives before a worker is idle.
+                    recognition_pool.submit(frame_seq, frame_time, small_rgb_frame, context=frame,
+                                            source=self.name, priority=self.priority(),
+                                            crop_frame=self.crop_frame(frame_seq, frame_time, frame, main))
+                    self.publish_results(recognition_pool)
+
+            else:
+                # Standby: the capture thread only grabs, a proximity heartbeat wakes us up
+                self.wakeup.wait(0.1)
+                self.wakeup.clear()
+
+        self.motion_gate.reset()
+        self.face_tracker.reset()
+        self.best_faces.reset()
+
+    def wait_for_slot(self, delay, recognition_pool=None):
+        """Wait 'delay' seconds for the next frame slot, publishing the worker results meanwhile."""
+        until = time.time() + delay
+        while not shutdown_event.is_set():
+            remaining = until - time.time()
+            if remaining <= 0:
+                break
+            if recognition_pool is None:
+                shutdown_event.wait(remaining)
+            else:
+                shutdown_event.wait(min(remaining, 0.02))
+                self.publish_results(recognition_pool, timeout=0)
+
+    def publish_results(self, recognition_pool, timeout=0.05):
+        for result in recognition_pool.results(self.name, timeout):
+            self.publish_result(result)
+            self.stats.add(time.time() - result.timestamp)
+
+    def encode_selected(self, frame_seq, frame, small_rgb_frame, boxes, selected, main=None):
+        """
+        Encode and match the selected faces, from crops of the full resolution frame
+        (the main stream frame 'main' in dual-stream mode, boxes mapped with map_box)
+        while it is still valid in its capture ring, else from the small frame.
+        """
+        to_frame = self.detection_region.to_frame
+        if main is not None:
+            capture, main_seq, _main_time, full_frame = main
+
+            def to_full(box):
+                return map_box(to_frame(box), frame.shape, full_frame.shape)
+
+            def valid():
+                return self.main_stream.valid(capture, main_seq)
+        else:
+            full_frame, to_full = frame, to_frame
+
+            def valid():
+                return self.capture.valid(frame_seq)
+        if TWO_STAGE_ENCODING and valid():
+            matches = face_matcher.identify_selected(
+                small_rgb_frame, boxes, selected, full_frame=full_frame, to_full=to_full,
+                padding=ENCODE_CROP_PADDING, max_face_size=ENCODE_MAX_FACE_SIZE)
+            if valid():
+                return matches
+            logger.debug(
+                f"{self.name}: frame {frame_seq} overwritten while encoding, encoding small frame")
+        return face_matcher.identify_selected(small_rgb_frame, boxes, selected)
+
+    def detect_in_thread(self, frame_seq, frame, small_rgb_frame, face_detector, main=None):
+        small_face_locations = self.detection_region.filter(
+            face_detector.detect(small_rgb_frame))
+        if small_face_locations:
+            self.motion_gate.keep_alive()
+        self.wakeup_timer.frame_processed(len(small_face_locations))
+
+        # Follow faces across frames; only new or stale tracks of good enough
+        # quality are encoded, all of them in one call and matched against
+        # the whole gallery at once.
+        qualities = None
+        try:
+            qualities = face_quality.assess(
+                small_rgb_frame, small_face_locations)
+            passed = {box: q.passed
+                      for box, q in zip(small_face_locations, qualities)}
+            tracks = self.face_tracker.identify(
+                small_face_locations,
+                lambda boxes: self.encode_selected(
+                    frame_seq, frame, small_rgb_frame, boxes, [passed[box] for box in boxes], main))
+        except Exception as e:
+            logger.error(f"Error during face comparison: {e}")
+            tracks = None
+        # no snapshot from a frame already overwritten in the capture ring
+        if not self.capture.valid(frame_seq):
+            qualities = None
+        publish_faces(self, frame, small_face_locations,
+                      tracks, qualities, frame_seq, main)
+
+    def publish_result(self, result):
+        """Track and publish the faces of a frame recognized by a worker."""
+        small_face_locations = self.detection_region.filter(
+            result.face_locations)
+        qualities = None
+        if result.error:
+            logger.error(
+                f"Error during face recognition in worker {result.worker_id}: {result.error}")
+            tracks = None
+        else:
+            if small_face_locations:
+                self.motion_gate.keep_alive()
+            self.wakeup_timer.frame_processed(len(small_face_locations))
+            matches = dict(zip(result.face_locations, result.matches))
+            encoded = dict(zip(result.face_locations, result.encoded))
+            # no snapshot from a frame already overwritten in the capture ring
+            if result.qualities is not None and self.capture.valid(result.seq):
+                by_box = dict(zip(result.face_locations, result.qualities))
+                qualities = [by_box[box] for box in small_face_locations]
+            # the worker's tracker decided which faces to encode
+            tracks = self.face_tracker.follow(
+                small_face_locations,
+                [matches[box] for box in small_face_locations],
+                [encoded[box] for box in small_face_locations])
+        # main stream frame of the snapshot, captured with the frame
+        main = self.main_frame(result.timestamp) if qualities else None
+        publish_faces(self, result.context, small_face_locations,
+                      tracks, qualities, result.seq, main)
+
+    def close(self):
+        if self.capture is not None:
+            self.capture.stop()
+            self.capture = None
+        if self.main_stream is not None:
+            self.main_stream.want(False, self.preroll_buffer.hold_until)
+            self.main_stream.stop()
+            self.main_stream = None
+
+    def metrics(self):
+        metrics = {"name": self.name, "proximity": self.proximity,
+                   "proximity_active": self.proximity_active, "running": self.running}
+        metrics.update(self.stats.as_dict())
+        del metrics["avg_busy_ms"]
+        return metrics
+
+
+# Camera sources; the preview shows the first one, clip names get the camera name with more than one
+cameras = [Camera(**spec, preview=index == 0,
+                  event_prefix=f"{spec['name']}_" if len(CAMERAS) > 1 else "")
+           for index, spec in enumerate(CAMERAS)]
+
+
+def camera_metrics():
+    """
+    Per-camera fps, frame age and dropped frames, the shared workers and the
+    frame governor decisions (/cameras endpoint).
+    """
+    pool = recognition_pool
+    metrics = {"cameras": [camera.metrics() for camera in cameras]}
+    if pool is not None:
+        with pool.lock:
+            source_stats = {source: dict(counts)
+                            for source, counts in pool.source_stats.items()}
+        empty = {"submitted": 0, "dropped": 0, "stale": 0}
+        for camera in metrics["cameras"]:
+            camera.update(source_stats.get(camera["name"], empty))
+        metrics["workers"] = pool.worker_stats()
+    metrics["governor"] = frame_governor.metrics()
+    return metrics
 
 
 def handle_face_detection(set_active):
     """
-    Runs face recognition while sending frames to the main thread for display.
+    Runs face recognition of all cameras while sending frames to the main thread for display.
     """
-    # global listener for logging
-    global _listener
-    # global first_detection
-    global face_recognition_running
     global sip_connection_active
-    # Track if face recognition is running
-    proximity_active = set_active
-    face_recognition_running = set_active
+    global recognition_pool
+    # global first_detection
     if sip_event_connected:
         sip_connection_active = sip_event_connected.is_set()
     else:
         sip_connection_active = False
 
     logger.info(
-        f"[231] 🔵 Started  handle_face_detection() face_recognition_running={face_recognition_running}")
+        f"[231] 🔵 Started  handle_face_detection() cameras={len(cameras)} active={set_active}")
 
-    rtsp_url = R20A_RTSP_URL
-    if rtsp_url is None:
+    if not cameras or any(camera.url is None for camera in cameras):
         logger.error("RTSP URL not set.")
         return
 
-    cap_thread = VideoCaptureThread(rtsp_url).start()
-
-    while not shutdown_event.is_set() and (not CONFIG_START_PROXIMITY_THD or face_recognition_running):
+    for camera in cameras:
+        camera.open(set_active)
+    scheduler = None
+    face_detector = None
+    if RECOGNITION_WORKERS > 0:
+        crop_sources = None
+        if TWO_STAGE_ENCODING:
+            if CAPTURE_PROCESS_ENABLED:
+                # workers read the full resolution frames from the capture rings
+                crop_sources = {camera.name: camera.crop_source()
+                                for camera in cameras}
+            else:
+                logger.warning("⚠️ Two-stage encoding in workers needs the capture process, "
+                               "encoding small frames.")
+        try:
+            recognition_pool = RecognitionPool(RECOGNITION_WORKERS, face_matcher, quality=face_quality,
+                                               crop_sources=crop_sources,
+                                               detector_kind=FACE_DETECTOR,
+                                               tracking=Camera.tracking(),
+                                               max_age=frame_governor.max_age if GOVERNOR_ENABLED else None).start()
+        except RuntimeError as e:
+            # e.g. missing detector model files: no recognition at all, stop the face process
+            logger.error(f"❌ {e}")
+            for camera in cameras:
+                camera.close()
+            shutdown_event.set()
+            return
+    else:
+        scheduler = FairScheduler()
+        face_detector = create_detector(FACE_DETECTOR)
+        logger.info(f"Face detector: {face_detector.kind}")
+        if CONFIG_WARM_STANDBY and not CONFIG_START_PROXIMITY_THD:
+            logger.info(
+                f"🔥 Models warmed up in {1000 * warm_up_models():.0f} ms, standing by")
+
+    threads = [threading.Thread(target=camera.run, args=(recognition_pool, scheduler, face_detector),
+                                name=f"camera-{camera.name}", daemon=True) for camera in cameras]
+    for thread in threads:
+        thread.start()
+
+    while any(thread.is_alive() for thread in threads):
         if sip_event_connected:
             if sip_connection_active == sip_event_connected.is_set():
                 # TODO: check this condition and equation
@@ -260,141 +890,50 @@ def handle_face_detection(set_active):
             else:
                 logger.debug(
                     f"[285] 🔵🔵🔵 Sip connection changed, --Not Equal-- active:{sip_connection_active}")
-
-        if proximity_active != proximity_server.is_proximity_active():
-            proximity_active = proximity_server.is_proximity_active()
-            # it is set if Proximity ON and clear if Proximity OFF
-            face_recognition_running = proximity_active
-            # logger.debug(f"[261] 🔴🔵 Face recognition, change running:{face_recognition_running}")
-
-        if face_recognition_running:
-            frame = cap_thread.read()
-            if frame is None:
-                continue
-
-            # Resize for faster processing
-            small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-            # Convert from BGR to RGB and ensure contiguous array
-            small_rgb_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-            small_rgb_frame = np.ascontiguousarray(small_rgb_frame)
-
-            # Detect faces.
-            """ another way, one by one
-            small_face_locations = face_recognition.face_locations(
-                small_rgb_frame, number_of_times_to_upsample=1, model='hog'
-            )
-
-            # Compute face encodings for each detected face
-            small_face_encodings = []
-            face_names = []        #
-            for face_location in small_face_locations:
-                try:
-                    # Use the basic usage as in the docs: pass image and a list containing the location
-                    encoding = face_recognition.face_encodings(small_rgb_frame, [face_location])[0]
-                    small_face_encodings.append(encoding)
-                except Exception as e:
-                    logger.error(f"Error computing encoding for face at {face_location}: {e}")
-                    small_face_encodings.append(None)
-            """
-
-            small_face_locations = face_recognition.face_locations(
-                small_rgb_frame, model='hog')
-            small_face_encodings = [face_recognition.face_encodings(
-                small_rgb_frame, [loc])[0] for loc in small_face_locations]
-
-            """
-            count_faces = len(small_face_locations)
-            # logger.info(f"Found faces:{count_faces}")
-            if count_faces > 0:
-                print(", ".join(str(location) for location in small_face_locations))
-                location_text = ""
-                for location in small_face_locations:
-                    for top, right, bottom, left in small_face_locations:
-                        beginX, beginY = left, top
-                        # sizeX and sizeY are the same that we calculate only one size
-                        # sizeX, sizeY = right - left, bottom - top
-                        size = right - left
-                        loc = f"beginX: {beginX}, beginY: {beginY}, size: {size}"
-
-                    if len(location_text) > 0:
-                        location_text = f"{location_text}, {loc}"
-                    else:
-                        location_text = f"({loc})"
-                print(f"Face locations: {location_text}")
-            """
-
-            face_names = []
-            # Compare encodings with known faces
-            for encoding in small_face_encodings:
-                if encoding is None:
-                    name = "Unknown"
-                else:
-                    try:
-                        matches = face_recognition.compare_faces(
-                            known_face_encodings, encoding, tolerance=0.6)
-                        name = "Unknown"
-                        if True in matches:
-                            first_match_index = matches.index(True)
-                            name = known_face_names[first_match_index]
-                    except Exception as e:
-                        logger.error("Error during face comparison:", e)
-                        name = "Error"
-                face_names.append(name)
-                # Invoke the filtering callback for each detected face.
-                on_face_detected(frame, name)
-
-            if CONFIG_ALLOW_DISPLAY_GUI:
-                # Send frame and face names to the GUI queue (Main Thread)
-                frame_queue.put((frame, small_face_locations, face_names))
-
-        else:
-            time.sleep(0.1)
+        shutdown_event.wait(0.5)
 
     logger.info("🔴 Face recognition stopped (proximity lost).")
+    if recognition_pool is not None:
+        recognition_pool.stop()
+        recognition_pool = None
     if _listener:
         time.sleep(0.1)
         _listener.stop()
         # logging.shutdown()    # alternative
-    cap_thread.stop()
+    for camera in cameras:
+        camera.close()
 
 
 def display_gui():
     """
     Runs in the main thread and displays frames.
+    The annotated frame is also JPEG-encoded once for all /preview.mjpeg clients.
     """
+    preview_seq = 0
     while not shutdown_event.is_set():
-        if not CONFIG_ALLOW_DISPLAY_GUI:
+        if not CONFIG_ALLOW_DISPLAY_GUI and not mjpeg_preview.has_clients():
             time.sleep(0.2)
             continue
 
-        if not frame_queue.empty():
-            frame, face_locations, face_names = frame_queue.get()
-
-            # Draw rectangles and labels
-            for (face_location, name) in zip(face_locations, face_names):
-                top, right, bottom, left = face_location
-                top, right, bottom, left = top * 4, right * 4, bottom * 4, left * 4
-                cv2.rectangle(frame, (left, top),
-                              (right, bottom), (0, 255, 0), 2)
-                cv2.rectangle(frame, (left, bottom - 20),
-                              (right, bottom), (0, 255, 0), cv2.FILLED)
-                cv2.putText(frame, name, (left + 6, bottom - 6),
-                            cv2.FONT_HERSHEY_DUPLEX, 0.5, (0, 0, 0), 1)
-
-            cv2.imshow('Face Recognition', frame)
-        else:
-            time.sleep(0.05)
+        preview_seq, item = preview_mailbox.get(preview_seq, timeout=0.05)
+        if item is not None:
+            frame = annotate_frame(*item)
+            if mjpeg_preview.has_clients():
+                mjpeg_preview.publish_frame(frame)
+            if CONFIG_ALLOW_DISPLAY_GUI:
+                cv2.imshow('Face Recognition', frame)
 
-        if cv2.waitKey(10) & 0xFF == ord('q'):
+        if CONFIG_ALLOW_DISPLAY_GUI and cv2.waitKey(10) & 0xFF == ord('q'):
             shutdown_event.set()
             break
 
-    cv2.destroyAllWindows()
+    if CONFIG_ALLOW_DISPLAY_GUI:
+        cv2.destroyAllWindows()
 
 
-def start_face_recognition(active):
+def start_face_recognition(active, sensor=None):
     """
-    Wrapper function to restart face recognition properly.
+    Wrapper function to restart face recognition properly (all cameras).
     """
     global face_recognition_thread
 
@@ -405,31 +944,26 @@ def start_face_recognition(active):
         face_recognition_thread.join()
         shutdown_event.clear()
 
-    # face_recognition_thread = threading.Thread(target=handle_face_detection, args=(frame_queue,), daemon=True)
     face_recognition_thread = threading.Thread(
         target=handle_face_detection, args=(active, ), daemon=True)
     face_recognition_thread.start()
 
 
-def save_video(frames, recognized_name="Unknown", fps=20):
-    """ Saves the stored frames into a video file """
-    if not frames:
-        return
-
-    date_string = get_current_date_time()
-    output_path = SYS_FACES_PATH + date_string + "_" + recognized_name + ".avi"
-    height, width, _ = frames[0].shape
-    fourcc = cv2.VideoWriter_fourcc(*"XVID")
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-
-    for frame in frames:
-        out.write(frame)
-
-    out.release()
-
-
 def main(sip_event):
     global face_recognition_enable_event
+    global sip_event_connected
+    # set while a SIP call is connected: the frame governor switches to the call detection rate
+    sip_event_connected = sip_event
+    for camera in cameras:
+        camera.clip_recorder.start()
+    # Live gallery updates: directory watcher and /enroll endpoint
+    proximity_server.known_faces_dir = SYS_KNOWN_FACES_PATH
+    proximity_server.gallery_callback = load_known_faces
+    proximity_server.unknown_visitors = unknown_visitors
+    proximity_server.camera_metrics = camera_metrics
+    if IDENTIFY_ENABLED:
+        proximity_server.identify_service = identify_service.start()
+    GalleryWatcher(SYS_KNOWN_FACES_PATH, load_known_faces).start()
     logger.info("🚀 Starting FastAPI server for proximity sensor...")
 
     if CONFIG_START_PROXIMITY_THD:
@@ -437,7 +971,8 @@ def main(sip_event):
             start_face_recognition,), daemon=True)
     else:
         server_thread = threading.Thread(
-            target=proximity_server.start_fastapi_server, args=(None,), daemon=True)
+            target=proximity_server.start_fastapi_server,
+            args=(wake_face_recognition if CONFIG_WARM_STANDBY else None,), daemon=True)
         threading.Thread(target=start_face_recognition,
                          args=(False, ), daemon=True).start()
     server_thread.start()
@@ -453,6 +988,14 @@ def main(sip_event):
     # display_gui(frame_queue)
     display_gui()
 
+    # Shutdown (signal or 'q' in the GUI): close the cameras, so their capture
+    # processes and ffmpeg segmenters do not outlive this process
+    shutdown_event.set()
+    if face_recognition_thread is not None:
+        face_recognition_thread.join(timeout=10)
+    for camera in cameras:
+        camera.clip_recorder.stop()
+
     # while True:
     #    if face_event.is_set():
     #        print("🟢 Face Recognition ENABLED")
@@ -0,0 +1,138 @@
+# motion_gate.py
+
+import time
+import cv2
+import numpy as np
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class MotionGate:
+    """
+    Cheap motion detector placed in front of HOG face detection.
+
+    Each (already downscaled) frame is cropped to the configured region,
+    converted to gray, shrunk once more and blurred; then it is compared with
+    the previous one (frame differencing). Detection runs only if enough
+    pixels changed, and keeps running for 'hold_time' seconds after the last
+    motion (or the last detected face), so a visitor standing still in front
+    of the door is still recognized.
+    The intermediate images are written into buffers reused from frame to frame.
+    """
+
+    def __init__(self, threshold=25, min_area=0.002, region=None, hold_time=1.5,
+                 scale=0.5, report_interval=60):
+        """
+        Args:
+            threshold: per pixel gray level difference counted as change.
+            min_area: fraction of region pixels that must change to report motion.
+            region: (x0, y0, x1, y1) as fractions of the frame, None = whole frame.
+            hold_time: seconds the gate stays open after the last motion.
+            scale: extra downscale applied before differencing.
+            report_interval: seconds between skip ratio log messages.
+        """
+        self.threshold = threshold
+        self.min_area = min_area
+        self.region = region
+        self.hold_time = hold_time
+        self.scale = scale
+        self.report_interval = report_interval
+        self.prev_gray = None
+        self.buffers = None     # small, gray, blurred x2, diff, mask - allocated per region size
+        self.hold_until = 0
+        self.frames = 0
+        self.skipped = 0
+        self.last_report = time.time()
+
+    def crop(self, frame):
+        """Returns the configured region of the frame (a view, no copy)."""
+        if self.region is None:
+            return frame
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = self.region
+        return frame[int(y0 * height):int(y1 * height), int(x0 * width):int(x1 * width)]
+
+    def allocate(self, region_shape):
+        height = max(int(round(region_shape[0] * self.scale)), 1)
+        width = max(int(round(region_shape[1] * self.scale)), 1)
+        self.buffers = {
+            "region_shape": region_shape,
+            "size": (width, height),
+            "small": np.empty((height, width, 3), dtype=np.uint8),
+            "gray": np.empty((height, width), dtype=np.uint8),
+            "blurred": [np.empty((height, width), dtype=np.uint8) for _ in range(2)],
+            "diff": np.empty((height, width), dtype=np.uint8),
+            "mask": np.empty((height, width), dtype=np.uint8),
+        }
+        self.prev_gray = None
+
+    def has_motion(self, frame):
+        """Frame differencing against the previous frame, True if enough pixels changed."""
+        region = self.crop(frame)
+        if self.buffers is None or self.buffers["region_shape"] != region.shape:
+            self.allocate(region.shape)
+        buffers = self.buffers
+        if self.scale != 1:
+            region = cv2.resize(region, buffers["size"], dst=buffers["small"],
+                                interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY, dst=buffers["gray"])
+        # alternate between two blurred buffers, the other one holds the previous frame
+        blurred = buffers["blurred"][0] if self.prev_gray is not buffers["blurred"][0] \
+            else buffers["blurred"][1]
+        gray = cv2.GaussianBlur(gray, (5, 5), 0, dst=blurred)
+
+        prev_gray, self.prev_gray = self.prev_gray, gray
+        if prev_gray is None:
+            return True
+
+        diff = cv2.absdiff(gray, prev_gray, dst=buffers["diff"])
+        _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY,
+                                dst=buffers["mask"])
+        changed = cv2.countNonZero(mask) / float(mask.size)
+        return changed >= self.min_area
+
+    def check(self, frame):
+        """
+        Returns True if face detection should run on this frame.
+        """
+        now = time.time()
+        motion = self.has_motion(frame)
+        if motion:
+            self.hold_until = now + self.hold_time
+
+        run = motion or now < self.hold_until
+        self.frames += 1
+        if not run:
+            self.skipped += 1
+
+        if now - self.last_report >= self.report_interval:
+            self.report()
+        return run
+
+    def keep_alive(self):
+        """Keep detection running, e.g. while faces are still being found."""
+        self.hold_until = max(self.hold_until, time.time() + self.hold_time)
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def stats(self):
+        return {"frames": self.frames, "skipped": self.skipped, "skip_ratio": self.skip_ratio}
+
+    def report(self):
+        if self.frames:
+            logger.debug(
+                f"Motion gate: skipped {self.skipped}/{self.frames} frames ({self.skip_ratio:.1%})")
+        self.last_report = time.time()
+
+    def reset(self):
+        """Report stats and forget the reference frame, e.g. when proximity goes off."""
+        self.report()
+        self.prev_gray = None
+        self.buffers = None     # small, gray, blurred x2, diff, mask - allocated per region size
+        self.hold_until = 0
+        self.frames = 0
+        self.skipped = 0
@@ -0,0 +1,102 @@
+# preroll_buffer.py
+
+import time
+import threading
+import cv2
+import numpy as np
+
+from collections import deque
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class PrerollBuffer:
+    """
+    Ring of JPEG-compressed, timestamped frames fed by the capture thread.
+
+    Frames are sampled at 'fps' and kept for 'seconds', but never more than
+    'memory_budget' bytes of JPEG data, so an event clip can cover the time
+    before and after the event for a fraction of the memory of raw frames.
+    The ring is fed only while it is enabled (e.g. proximity active) or held
+    open for the post-roll of an accepted event.
+    """
+
+    def __init__(self, seconds=10, fps=5, memory_budget=32 * 1024 * 1024, jpeg_quality=80):
+        self.seconds = seconds
+        self.interval = 1.0 / fps
+        self.memory_budget = memory_budget
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+        self.lock = threading.Lock()
+        self.entries = deque()      # (timestamp, jpeg bytes)
+        self.size = 0
+        self.last_added = 0
+        self.enabled = True
+        self.hold_until = 0
+        # > 1 lowers the sampling rate (CPU short, see FrameGovernor)
+        self.interval_scale = 1.0
+
+    def hold(self, until):
+        """Keep the ring fed until the given time, e.g. the end of a post-roll."""
+        self.hold_until = max(self.hold_until, until)
+
+    def wanted(self, timestamp):
+        """True if the ring is fed at 'timestamp' (enabled, or held open for a post-roll)."""
+        return self.enabled or timestamp < self.hold_until
+
+    def due(self, timestamp):
+        """True if the capture thread should retrieve and add the frame grabbed at 'timestamp'."""
+        if not self.wanted(timestamp):
+            return False
+        # small tolerance, so capture jitter does not halve the rate when fps matches the stream
+        return timestamp - self.last_added >= 0.9 * self.interval * self.interval_scale
+
+    def add(self, timestamp, frame):
+        ok, jpeg = cv2.imencode(".jpg", frame, self.encode_params)
+        if not ok:
+            logger.warning("Pre-roll: JPEG encoding failed")
+            return
+        jpeg = jpeg.tobytes()
+        with self.lock:
+            self.last_added = timestamp
+            self.entries.append((timestamp, jpeg))
+            self.size += len(jpeg)
+            while self.entries and (self.size > self.memory_budget or
+                                    timestamp - self.entries[0][0] > self.seconds):
+                _, old = self.entries.popleft()
+                self.size -= len(old)
+
+    def snapshot(self, start, end):
+        """Returns the (timestamp, jpeg) entries between 'start' and 'end'."""
+        with self.lock:
+            return [(ts, jpeg) for ts, jpeg in self.entries if start <= ts <= end]
+
+    @staticmethod
+    def frame_rate(entries, default):
+        """Real frame rate of the stored entries, from their timestamps."""
+        if len(entries) < 2:
+            return default
+        duration = entries[-1][0] - entries[0][0]
+        return (len(entries) - 1) / duration if duration > 0 else default
+
+    @staticmethod
+    def decode(entries):
+        """Generator of decoded BGR frames, one at a time."""
+        for _ts, jpeg in entries:
+            data = np.frombuffer(jpeg, dtype=np.uint8)
+            frame = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            if frame is not None:
+                yield frame
+
+    def clip(self, event_time, before, after):
+        """
+        Wait until the post-roll is recorded and return (frames, fps) for the
+        clip from 'before' seconds before to 'after' seconds after the event.
+        'frames' is a generator, frames are decoded while the clip is written.
+        """
+        self.hold(event_time + after)
+        delay = event_time + after - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        entries = self.snapshot(event_time - before, event_time + after)
+        return self.decode(entries), self.frame_rate(entries, 1.0 / self.interval)
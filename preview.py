@@ -0,0 +1,104 @@
+# preview.py
+
+import threading
+import cv2
+
+from config import *
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class LatestMailbox:
+    """
+    One-slot mailbox: put() replaces the previous item, so a slow reader
+    always gets the latest item and memory never grows.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.item = None
+        self.seq = 0
+
+    def put(self, item):
+        with self.condition:
+            self.item = item
+            self.seq += 1
+            self.condition.notify_all()
+
+    def get(self, last_seq=0, timeout=None):
+        """
+        Returns (seq, item) newer than 'last_seq', waiting up to 'timeout'
+        seconds. 'item' is None on timeout.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.seq > last_seq, timeout)
+            if self.seq <= last_seq:
+                return last_seq, None
+            return self.seq, self.item
+
+
+class MjpegBroadcaster:
+    """
+    Latest JPEG of the annotated preview, shared by all MJPEG clients.
+
+    Each frame is encoded once, only while at least one client is
+    connected; every client just sends the current bytes.
+    """
+
+    def __init__(self, scale=0.5, jpeg_quality=70):
+        self.scale = scale
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+        self.lock = threading.Lock()
+        self.jpeg = None
+        self.seq = 0
+        self.clients = 0
+
+    def has_clients(self):
+        return self.clients > 0
+
+    def publish_frame(self, frame):
+        if self.scale != 1:
+            frame = cv2.resize(frame, (0, 0), fx=self.scale, fy=self.scale,
+                               interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode(".jpg", frame, self.encode_params)
+        if not ok:
+            return
+        with self.lock:
+            self.jpeg = jpeg.tobytes()
+            self.seq += 1
+
+    def latest(self):
+        """Returns (seq, jpeg bytes) of the latest preview frame."""
+        with self.lock:
+            return self.seq, self.jpeg
+
+    def client_connected(self):
+        with self.lock:
+            self.clients += 1
+        logger.info(f"Preview client connected ({self.clients} active)")
+
+    def client_disconnected(self):
+        with self.lock:
+            self.clients -= 1
+        logger.info(f"Preview client disconnected ({self.clients} active)")
+
+
+def annotate_frame(frame, face_locations, face_names):
+    """Returns a copy of the frame with face boxes and names drawn on it."""
+    # The frame is shared with the capture thread, draw on a copy
+    frame = frame.copy()
+    for (face_location, name) in zip(face_locations, face_names):
+        top, right, bottom, left = face_location
+        cv2.rectangle(frame, (left, top),
+                      (right, bottom), (0, 255, 0), 2)
+        cv2.rectangle(frame, (left, bottom - 20),
+                      (right, bottom), (0, 255, 0), cv2.FILLED)
+        cv2.putText(frame, name, (left + 6, bottom - 6),
+                    cv2.FONT_HERSHEY_DUPLEX, 0.5, (0, 0, 0), 1)
+    return frame
+
+
+# Shared by the face process GUI loop (producer) and proximity_server (clients)
+mjpeg_preview = MjpegBroadcaster(
+    scale=PREVIEW_MJPEG_SCALE, jpeg_quality=PREVIEW_MJPEG_QUALITY)
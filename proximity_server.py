@@ -1,66 +1,290 @@
 # proximity_server.py
 
+import os
+import re
+import hmac
 import time
+import queue
+import asyncio
 import datetime
 import threading
 import uvicorn
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import StreamingResponse
 from helper import *
+from config import API_TOKEN, PREVIEW_MJPEG_ENABLED, UNKNOWN_ENROLL_MIN_COUNT
+from preview import mjpeg_preview
 from logger_config import get_logger
 
 app = FastAPI()
 
 logger = get_logger(__name__)
 
-# Global state tracking
-last_event_time = 0
-proximity_active = False
+# Global state tracking, per proximity sensor (one per camera, see CAMERAS in config.py)
+DEFAULT_SENSOR = "door"  # sensor of the plain /proximity heartbeat
+# sensor name -> {"active": bool, "since": time of the first heartbeat, "last_event": time}
+sensors = {}
+sensors_lock = threading.Lock()
 CHECK_INTERVAL = 1
 TIMEOUT = 3.5
-proximity_callback = None  # Function to trigger face recognition
+# Function to trigger face recognition, called with (active, sensor)
+proximity_callback = None
+camera_metrics = None  # Function returning the per-camera metrics of the face process
+# Enrollment of known faces
+known_faces_dir = "known_faces/"
+# Function to reload the gallery, returns the list of known names
+gallery_callback = None
+unknown_visitors = None  # UnknownVisitorStore of the face process
+identify_service = None  # IdentifyService of the face process (POST /identify)
 
 
 def monitor_proximity():
     """Background thread to detect when proximity goes OFF."""
-    global proximity_active, last_event_time
     while True:
         time.sleep(CHECK_INTERVAL)
-        if proximity_active and (time.time() - last_event_time) > TIMEOUT:
-            # current_time = get_current_time()
-            # print(f"[{current_time}] 🔴 Proximity OFF: No heartbeat received, stopping face recognition.")
-            logger.info(
-                f"🔴 Proximity OFF: No heartbeat received, stopping face recognition.")
-            proximity_active = False
+        with sensors_lock:
+            for sensor, state in sensors.items():
+                if state["active"] and (time.time() - state["last_event"]) > TIMEOUT:
+                    # current_time = get_current_time()
+                    # print(f"[{current_time}] 🔴 Proximity OFF: No heartbeat received, stopping face recognition.")
+                    logger.info(
+                        f"🔴 Proximity OFF ({sensor}): No heartbeat received, stopping face recognition.")
+                    state["active"] = False
 
 
 # Start the background monitoring thread
 threading.Thread(target=monitor_proximity, daemon=True).start()
 
 
-@app.get("/proximity")
-@app.post("/proximity")
-async def proximity_event():
-    global last_event_time, proximity_active
-
-    last_event_time = time.time()
-
-    if not proximity_active:
+def proximity_heartbeat(sensor):
+    now = time.time()
+    with sensors_lock:
+        state = sensors.setdefault(
+            sensor, {"active": False, "since": 0, "last_event": 0})
+        state["last_event"] = now
+        started = not state["active"]
+        if started:
+            state["since"] = now
+            state["active"] = True
+    if started:
         logger.info(
-            f"🟢 Proximity ON: Detected object! Starting face recognition...")
-        proximity_active = True
+            f"🟢 Proximity ON ({sensor}): Detected object! Starting face recognition...")
 
         # Trigger the face recognition process
         if proximity_callback:
             threading.Thread(target=proximity_callback, args=(
-                proximity_active, ), daemon=True).start()
+                True, sensor), daemon=True).start()
 
     return {"status": "Heartbeat received"}
 
 
-def is_proximity_active():
+@app.get("/proximity")
+@app.post("/proximity")
+async def proximity_event():
+    return proximity_heartbeat(DEFAULT_SENSOR)
+
+
+@app.get("/proximity/{sensor}")
+@app.post("/proximity/{sensor}")
+async def sensor_proximity_event(sensor: str):
+    """Heartbeat of a named proximity sensor, bound to cameras in config.py."""
+    if not re.fullmatch(r"[\w\-]{1,32}", sensor):
+        raise HTTPException(status_code=400, detail="Invalid sensor name")
+    return proximity_heartbeat(sensor)
+
+
+def require_auth(request: Request):
+    """
+    Endpoints that change the known faces or expose face images or identities: the request must carry
+    API_TOKEN (X-Api-Token header or 'token' query parameter), without a configured
+    token only local clients are allowed.
+    """
+    if API_TOKEN:
+        token = (request.headers.get("x-api-token")
+                 or request.query_params.get("token") or "")
+        if not hmac.compare_digest(token.encode(), API_TOKEN.encode()):
+            raise HTTPException(status_code=401, detail="Invalid token")
+    elif request.client is None or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(
+            status_code=403, detail="Local clients only, API_TOKEN not set")
+
+
+def enrollment_path(name, extension=".jpg"):
+    """Image path in the known faces directory for a person name."""
+    if not re.fullmatch(r"[\w\-. ]{1,64}", name) or name.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid name")
+    return os.path.join(known_faces_dir, name + extension)
+
+
+async def reload_gallery():
+    if gallery_callback is None:
+        return None
+    # Encoding is CPU bound, keep it off the event loop
+    return await asyncio.to_thread(gallery_callback)
+
+
+@app.post("/enroll", dependencies=[Depends(require_auth)])
+async def enroll_face(name: str = Form(...), image: UploadFile = File(...)):
+    """Add or replace the image of a known person, the gallery is updated without restart."""
+    extension = os.path.splitext(image.filename or "")[1].lower()
+    if extension not in (".jpg", ".jpeg", ".png"):
+        extension = ".jpg"
+    path = enrollment_path(name, extension)
+    data = await image.read()
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty image")
+
+    # Write to a temporary name first, so the watcher never sees a partial image
+    tmp_path = os.path.join(known_faces_dir, f".{name}.upload")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    logger.info(f"📝 Enrolled face image: {path}")
+
+    known_names = await reload_gallery()
+    if known_names is not None and name not in known_names:
+        return {"status": "No face found in image", "name": name}
+    return {"status": "Enrolled", "name": name}
+
+
+@app.delete("/enroll/{name}", dependencies=[Depends(require_auth)])
+async def remove_face(name: str):
+    """Remove the image(s) of a known person from the gallery."""
+    removed = []
+    for extension in (".jpg", ".jpeg", ".png"):
+        path = enrollment_path(name, extension)
+        if os.path.exists(path):
+            os.remove(path)
+            removed.append(path)
+    if not removed:
+        raise HTTPException(status_code=404, detail="Unknown name")
+    logger.info(f"📝 Removed face image(s): {removed}")
+    await reload_gallery()
+    return {"status": "Removed", "name": name}
+
+
+@app.get("/unknown", dependencies=[Depends(require_auth)])
+async def list_unknown_visitors(min_count: int = 1):
+    """Recurring unknown visitors, most frequent first."""
+    if unknown_visitors is None:
+        raise HTTPException(
+            status_code=404, detail="Unknown visitor store not available")
+    return {"visitors": unknown_visitors.list(min_count)}
+
+
+@app.get("/unknown/candidates", dependencies=[Depends(require_auth)])
+async def list_enrollment_candidates():
+    """Unknown visitors seen often enough to be worth enrolling."""
+    if unknown_visitors is None:
+        raise HTTPException(
+            status_code=404, detail="Unknown visitor store not available")
+    return {"visitors": [v for v in unknown_visitors.list(UNKNOWN_ENROLL_MIN_COUNT) if v["snapshot"]]}
+
+
+@app.post("/unknown/{visitor_id}/enroll", dependencies=[Depends(require_auth)])
+async def enroll_unknown_visitor(visitor_id: str, name: str = Form(...)):
+    """Enroll a recurring unknown visitor under 'name', using its latest snapshot."""
+    if unknown_visitors is None:
+        raise HTTPException(
+            status_code=404, detail="Unknown visitor store not available")
+    if not re.fullmatch(r"visitor-\d+", visitor_id):
+        raise HTTPException(status_code=404, detail="Unknown visitor")
+    snapshot = unknown_visitors.snapshot_path(visitor_id)
+    if not os.path.exists(snapshot):
+        raise HTTPException(status_code=404, detail="Unknown visitor")
+    path = enrollment_path(name)
+    with open(snapshot, "rb") as f:
+        data = f.read()
+    tmp_path = os.path.join(known_faces_dir, f".{name}.upload")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    logger.info(f"📝 Enrolled unknown visitor {visitor_id} as {name}: {path}")
+
+    known_names = await reload_gallery()
+    if known_names is not None and name not in known_names:
+        return {"status": "No face found in image", "name": name, "visitor": visitor_id}
+    unknown_visitors.remove(visitor_id)
+    return {"status": "Enrolled", "name": name, "visitor": visitor_id}
+
+
+@app.post("/identify", dependencies=[Depends(require_auth)])
+async def identify_faces(images: list[UploadFile] = File(...)):
+    """
+    Identify the faces on JPEG images with the gallery of the face process.
+    Images of concurrent requests are encoded and matched together in micro-batches.
+    """
+    if identify_service is None:
+        raise HTTPException(
+            status_code=404, detail="Identification not available")
+    max_images = identify_service.requests.maxsize
+    if len(images) > max_images:
+        raise HTTPException(status_code=413,
+                            detail=f"More than {max_images} images")
+    max_bytes = identify_service.max_bytes
+    jpegs = []
+    for image in images:
+        data = await image.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            raise HTTPException(status_code=413,
+                                detail=f"Image larger than {max_bytes} bytes")
+        jpegs.append(data)
+    # all images of the request are queued, or none
+    try:
+        futures = identify_service.submit(jpegs)
+    except queue.Full:
+        raise HTTPException(status_code=503, detail="Identification busy")
+    results = await asyncio.gather(*[asyncio.wrap_future(future) for future in futures])
+    return {"images": [dict(result, filename=image.filename) for image, result in zip(images, results)]}
+
+
+async def mjpeg_stream():
+    """Sends the shared latest preview JPEG whenever it changes."""
+    mjpeg_preview.client_connected()
+    try:
+        last_seq = -1
+        while True:
+            seq, jpeg = mjpeg_preview.latest()
+            if jpeg is not None and seq != last_seq:
+                last_seq = seq
+                yield (b"--frame\r\nContent-Type: image/jpeg\r\n"
+                       b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+            await asyncio.sleep(0.05)
+    finally:
+        mjpeg_preview.client_disconnected()
+
+
+@app.get("/preview.mjpeg", dependencies=[Depends(require_auth)])
+async def preview_mjpeg():
+    """Live annotated preview of the face recognition, shared by all clients."""
+    if not PREVIEW_MJPEG_ENABLED:
+        raise HTTPException(status_code=404, detail="Preview disabled")
+    return StreamingResponse(mjpeg_stream(), media_type="multipart/x-mixed-replace; boundary=frame")
+
+
+@app.get("/cameras")
+async def list_cameras():
+    """Per-camera fps, frame age and proximity state of the face process, and frame governor decisions."""
+    if camera_metrics is None:
+        raise HTTPException(
+            status_code=404, detail="Camera metrics not available")
+    return camera_metrics()
+
+
+def is_proximity_active(sensor=DEFAULT_SENSOR):
     """Returns True if proximity sensor is still detecting motion"""
-    return proximity_active  # Used in face recognition loop
+    with sensors_lock:
+        state = sensors.get(sensor)
+        # Used in face recognition loop
+        return state is not None and state["active"]
+
+
+def proximity_started(sensor=DEFAULT_SENSOR):
+    """Time of the first heartbeat of the current proximity of 'sensor'."""
+    with sensors_lock:
+        state = sensors.get(sensor)
+        return state["since"] if state is not None else 0
 
 
 def start_fastapi_server(callback):
@@ -0,0 +1,486 @@
+# recognition_pool.py
+
+import time
+import queue
+import threading
+import multiprocessing
+import numpy as np
+
+from collections import deque, namedtuple
+from face_detectors import create_detector
+from face_matcher import FaceMatcher, warm_up_models
+from face_tracker import FaceTracker
+from frame_scheduler import FairScheduler
+from shared_capture import FrameRing, reset_child_signals
+from dual_stream import map_box
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Result of one frame of camera 'source', handed back to its detection loop in sequence order;
+# 'encoded' per face as taken by FaceTracker.follow
+RecognitionResult = namedtuple(
+    "RecognitionResult", "source seq timestamp worker_id face_locations qualities matches encoded context error")
+# Two-stage recognition in the workers: the camera's capture ring 'ring_name', boxes
+# mapped with its DetectionRegion 'region'
+CropSource = namedtuple("CropSource", "ring_name region padding max_face_size")
+# Full resolution frame of a task, in the shared capture ring 'ring_name' (the camera's
+# ring, or in dual-stream mode the ring of the current main stream opening); 'frame_shape'
+# is the shape of the frame the detection region applies to
+CropFrame = namedtuple("CropFrame", "ring_name seq timestamp frame_shape")
+
+
+def recognition_worker(worker_id, task_queue, control_queue, result_queue, ready_queue, encodings, names,
+                       keys, tolerance, index_kind, balltree_threshold, quality=None, crop_sources=None,
+                       detector_kind="hog", tracking=None):
+    """
+    Worker process: detect, encode and match the faces of one small RGB frame at a time.
+    The gallery copy uses the same index settings as the pool's matcher.
+    Faces are detected with the 'detector_kind' backend (see face_detectors.py).
+    With a FaceQuality 'quality', faces below its thresholds are not encoded (match None).
+    With a CropSource for the frame's source in 'crop_sources' and a CropFrame in the
+    task, faces are encoded from padded crops of that full resolution frame, read from
+    its shared capture ring (small frame if it was overwritten or the ring is gone).
+    With FaceTracker arguments 'tracking', the faces of every source are followed by
+    a tracker of this worker and only new or stale tracks are encoded; the tracker
+    starts over when the task's epoch of the source changes (see reset_tracks).
+    Gallery changes sent through 'control_queue' (see FaceMatcher.apply) are applied
+    in order before the next frame.
+    Puts (worker_id, None) on 'ready_queue' once the models are loaded, (worker_id, error) on failure.
+    """
+    reset_child_signals()
+    try:
+        matcher = FaceMatcher(tolerance=tolerance, index_kind=index_kind,
+                              balltree_threshold=balltree_threshold)
+        matcher.set_gallery(encodings, names, keys)
+        detector = create_detector(detector_kind)
+        warm_up_time = warm_up_models()
+    except Exception as e:
+        ready_queue.put((worker_id, f"{type(e).__name__}: {e}"))
+        return
+    ready_queue.put((worker_id, None))
+    logger.info(f"Recognition worker {worker_id} started (pid={multiprocessing.current_process().pid}), "
+                f"{detector.kind} detector, models warmed up in {1000 * warm_up_time:.0f} ms")
+    crop_sources = crop_sources or {}
+    rings = {}          # ring name -> FrameRing, attached on first use
+    main_rings = {}     # source -> name of its attached main stream ring
+    trackers = {}       # source -> (epoch, FaceTracker)
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        while True:
+            try:
+                change = control_queue.get_nowait()
+            except queue.Empty:
+                break
+            matcher.apply(*change)
+        source, seq, rgb_frame, crop_frame, epoch = task
+        crop_source = crop_sources.get(source)
+        ring = None
+        if crop_source is not None and crop_frame is not None:
+            ring_name = crop_frame.ring_name
+            if ring_name in rings:
+                ring = rings[ring_name]
+            else:
+                if ring_name != crop_source.ring_name and source in main_rings:
+                    # the main stream was opened again, with a new ring
+                    stale = rings.pop(main_rings.pop(source))
+                    if stale is not None:
+                        stale.close()
+                try:
+                    ring = FrameRing.attach(ring_name)
+                except (FileNotFoundError, ValueError) as e:
+                    logger.warning(f"Recognition worker {worker_id}: no capture ring {ring_name} "
+                                   f"for {source}, encoding small frames: {e}")
+                rings[ring_name] = ring
+                if ring_name != crop_source.ring_name:
+                    main_rings[source] = ring_name
+        tracker = None
+        if tracking is not None:
+            tracker_epoch, tracker = trackers.get(source, (None, None))
+            if tracker_epoch != epoch:
+                # new proximity of the camera: forget its faces
+                if tracker is not None:
+                    tracker.reset()
+                tracker = FaceTracker(**tracking)
+                trackers[source] = (epoch, tracker)
+
+        def encode(boxes, selected):
+            """Encode and match the selected boxes, from full resolution crops if possible."""
+            if ring is not None and boxes:
+                _timestamp, full_frame = ring.read(crop_frame.seq)
+                if full_frame is not None:
+                    region = crop_source.region
+                    if crop_frame.frame_shape != region.frame_shape:
+                        region.update_geometry(crop_frame.frame_shape)
+                    if full_frame.shape == crop_frame.frame_shape:
+                        to_full = region.to_frame
+                    else:
+                        # main stream frame in dual-stream mode
+                        def to_full(box, to_frame=region.to_frame, shape=full_frame.shape):
+                            return map_box(to_frame(box), crop_frame.frame_shape, shape)
+                    matches = matcher.identify_selected(
+                        rgb_frame, boxes, selected, full_frame, to_full,
+                        crop_source.padding, crop_source.max_face_size)
+                    if ring.valid(crop_frame.seq):
+                        return matches
+                    # overwritten while encoding
+            return matcher.identify_selected(rgb_frame, boxes, selected)
+
+        start = time.time()
+        try:
+            face_locations = detector.detect(rgb_frame)
+            if quality is not None:
+                qualities = quality.assess(rgb_frame, face_locations)
+                selected = [q.passed for q in qualities]
+            else:
+                qualities = None
+                selected = [True] * len(face_locations)
+            if tracker is None:
+                matches = encode(face_locations, selected)
+                encoded = [True if keep else None for keep in selected]
+            else:
+                # only new or stale tracks are encoded
+                passed = dict(zip(face_locations, selected))
+                tracks = tracker.identify(
+                    face_locations, lambda boxes: encode(boxes, [passed[box] for box in boxes]))
+                matches = [(track.name, track.distance, track.encoding)
+                           if track.encoded_box is not None else None for track in tracks]
+                encoded = [True if track.fresh else None if tracker.needs_encode(track) else False
+                           for track in tracks]
+            error = None
+        except Exception as e:
+            face_locations, qualities, error = [], None, str(e)
+            matches, encoded = [], []
+        result_queue.put((source, seq, worker_id, face_locations, qualities, matches, encoded,
+                          time.time() - start, error))
+
+
+class FrameStats:
+    """Throughput and frame age (capture to decision) of one worker or camera."""
+
+    def __init__(self, window=10.0):
+        self.started = time.time()
+        self.window = window
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.busy_time = 0.0
+        self.age_sum = 0.0
+        self.max_age = 0.0
+        self.last_age = None
+        self.recent = deque()   # decision times within the last 'window' seconds
+
+    def add(self, age):
+        """Count a frame whose result reached the decision stage 'age' seconds after capture."""
+        now = time.time()
+        with self.lock:
+            self.frames += 1
+            self.age_sum += age
+            self.max_age = max(self.max_age, age)
+            self.last_age = age
+            self.recent.append(now)
+            while self.recent[0] < now - self.window:
+                self.recent.popleft()
+
+    def as_dict(self):
+        now = time.time()
+        with self.lock:
+            while self.recent and self.recent[0] < now - self.window:
+                self.recent.popleft()
+            elapsed = now - self.started
+            return {
+                "frames": self.frames,
+                "fps": self.frames / elapsed if elapsed > 0 else 0.0,
+                # over the last 'window' seconds, e.g. during the current proximity
+                "recent_fps": len(self.recent) / min(self.window, elapsed) if elapsed > 0 else 0.0,
+                "avg_busy_ms": 1000 * self.busy_time / self.frames if self.frames else 0.0,
+                "avg_age_ms": 1000 * self.age_sum / self.frames if self.frames else 0.0,
+                "max_age_ms": 1000 * self.max_age,
+                "last_age_ms": 1000 * self.last_age if self.last_age is not None else None,
+            }
+
+
+class RecognitionPool:
+    """
+    Pool of recognition worker processes shared by all cameras, with
+    latest-frame-wins semantics.
+
+    Every camera ('source') has one pending slot: a submitted frame waits there
+    until a worker becomes idle and is replaced by the next frame of the same
+    camera if none did, so no worker ever processes a stale frame. A
+    FairScheduler decides which camera's pending frame an idle worker gets
+    (higher priority, i.e. active proximity, first, then the camera served
+    least recently). Results are returned per camera in frame sequence order,
+    together with the context (e.g. the full resolution frame) that was passed
+    to submit(). A collector thread receives the results, so several camera
+    threads can submit and read concurrently.
+    A pending frame older than 'max_age' seconds when a worker becomes idle is
+    dropped as stale instead of processed (None = no deadline).
+    With FaceTracker arguments 'tracking', the workers track the faces of each
+    camera and encode only new or stale tracks; reset_tracks() starts over.
+
+    start() fails (RuntimeError) if a worker cannot load its models. A worker
+    that dies later is replaced; its frame in flight is returned as an error
+    result, so the results of its camera do not wait for it forever.
+    """
+
+    def __init__(self, workers, matcher, quality=None, crop_sources=None, detector_kind="hog",
+                 max_age=None, tracking=None, report_interval=60, start_timeout=120):
+        self.workers = workers
+        self.matcher = matcher
+        self.quality = quality
+        self.crop_sources = crop_sources
+        self.detector_kind = detector_kind
+        self.max_age = max_age
+        self.tracking = tracking
+        self.report_interval = report_interval
+        self.start_timeout = start_timeout
+        self.scheduler = FairScheduler()
+        self.result_queue = multiprocessing.Queue()
+        self.ready_queue = multiprocessing.Queue()
+        self.task_queues = [None] * workers
+        self.control_queues = [None] * workers
+        self.processes = [None] * workers
+        self.last_check = 0
+        self.lock = threading.Lock()
+        self.results_ready = threading.Condition(self.lock)
+        self.idle = []
+        # source -> (seq, timestamp, rgb_frame, context, priority, crop_frame)
+        self.pending = {}
+        # (source, seq) -> (timestamp, context, worker_id)
+        self.in_flight = {}
+        # (source, seq) -> RecognitionResult, waiting for older frames
+        self.completed = {}
+        self.stats = {}
+        self.source_stats = {}  # source -> submitted / dropped / stale frame counts
+        self.epochs = {}        # source -> tracker epoch, see reset_tracks()
+        self.dropped = 0
+        self.last_report = time.time()
+        self.running = False
+        self.collector = None
+
+    def start_worker(self, worker_id):
+        """Start the process of 'worker_id' with the current gallery; idle once it reports ready."""
+        self.task_queues[worker_id] = multiprocessing.Queue(maxsize=1)
+        # changes from here on are queued for the new worker, after the snapshot it starts with
+        self.control_queues[worker_id] = multiprocessing.Queue()
+        encodings, names, keys = self.matcher.snapshot()
+        encodings = np.array(encodings, dtype=np.float32)
+        process = multiprocessing.Process(
+            target=recognition_worker,
+            args=(worker_id, self.task_queues[worker_id], self.control_queues[worker_id],
+                  self.result_queue, self.ready_queue, encodings, list(names),
+                  list(keys), self.matcher.tolerance, self.matcher.index_kind,
+                  self.matcher.balltree_threshold, self.quality, self.crop_sources,
+                  self.detector_kind, self.tracking),
+            daemon=True)
+        process.start()
+        self.processes[worker_id] = process
+        self.stats.setdefault(worker_id, FrameStats())
+
+    def start(self):
+        for worker_id in range(self.workers):
+            self.start_worker(worker_id)
+        # all workers must load their models (e.g. the DNN detector files), else no pool
+        deadline = time.time() + self.start_timeout
+        while len(self.idle) < self.workers:
+            try:
+                worker_id, error = self.ready_queue.get(
+                    timeout=max(0.1, deadline - time.time()))
+            except queue.Empty:
+                error = f"not ready within {self.start_timeout} s"
+                worker_id = next(w for w in range(self.workers)
+                                 if w not in self.idle)
+            if error is not None:
+                self.terminate()
+                raise RuntimeError(
+                    f"Recognition worker {worker_id} failed to start: {error}")
+            self.idle.append(worker_id)
+        self.running = True
+        self.collector = threading.Thread(target=self.collect, daemon=True)
+        self.collector.start()
+        self.matcher.listeners.append(self.gallery_changed)
+        logger.info(f"🚀 Recognition pool started with {self.workers} workers")
+        return self
+
+    def gallery_changed(self, operation, *args):
+        """Send a gallery change to all workers, applied in order before their next frame."""
+        if operation == "set":
+            encodings, names, keys = args
+            # plain array copy, the gallery may be a memory-mapped cache file
+            args = (np.array(encodings, dtype=np.float32),
+                    list(names), list(keys))
+        for control_queue in self.control_queues:
+            control_queue.put((operation,) + args)
+
+    def submit(self, seq, timestamp, rgb_frame, context=None, source=None, priority=0, crop_frame=None):
+        """
+        Queue a frame of 'source' for the next idle worker. A frame of the same
+        source still waiting is dropped; returns False in that case.
+        """
+        with self.lock:
+            counts = self.source_stats.setdefault(
+                source, {"submitted": 0, "dropped": 0, "stale": 0})
+            counts["submitted"] += 1
+            replaced = source in self.pending
+            if replaced:
+                counts["dropped"] += 1
+                self.dropped += 1
+            self.pending[source] = (
+                seq, timestamp, rgb_frame, context, priority, crop_frame)
+            self._dispatch()
+        return not replaced
+
+    def reset_tracks(self, source):
+        """Make the workers forget the tracked faces of 'source' from its next frame on."""
+        with self.lock:
+            self.epochs[source] = self.epochs.get(source, 0) + 1
+
+    def _dispatch(self):
+        """Hand pending frames to idle workers (called with the lock held)."""
+        while self.idle and self.pending:
+            source = self.scheduler.pick(
+                {source: item[4] for source, item in self.pending.items()})
+            item = self.pending.pop(source)
+            seq, timestamp, rgb_frame, context, _priority, crop_frame = item
+            if self.max_age is not None and time.time() - timestamp > self.max_age:
+                self.source_stats[source]["stale"] += 1
+                continue
+            worker_id = self.idle.pop()
+            self.in_flight[(source, seq)] = (timestamp, context, worker_id)
+            self.task_queues[worker_id].put_nowait(
+                (source, seq, rgb_frame, crop_frame, self.epochs.get(source, 0)))
+
+    def check_workers(self):
+        """Replace dead workers, their frames in flight become error results (collector thread)."""
+        while True:
+            try:
+                worker_id, error = self.ready_queue.get_nowait()
+            except queue.Empty:
+                break
+            if error is not None:
+                logger.error(
+                    f"❌ Recognition worker {worker_id} failed to restart: {error}")
+                continue
+            logger.info(f"Recognition worker {worker_id} restarted")
+            with self.lock:
+                self.idle.append(worker_id)
+                self._dispatch()
+
+        for worker_id, process in enumerate(self.processes):
+            if process is None or process.is_alive():
+                continue
+            logger.error(
+                f"❌ Recognition worker {worker_id} died (exit code {process.exitcode}), restarting")
+            self.processes[worker_id] = None
+            with self.lock:
+                if worker_id in self.idle:
+                    self.idle.remove(worker_id)
+                for key in [key for key, item in self.in_flight.items() if item[2] == worker_id]:
+                    timestamp, context, _worker_id = self.in_flight.pop(key)
+                    self.completed[key] = RecognitionResult(
+                        key[0], key[1], timestamp, worker_id, [], None, [], [], context, "worker died")
+                self.results_ready.notify_all()
+            self.start_worker(worker_id)
+
+    def collect(self):
+        """Collector thread: move finished frames from the result queue to 'completed'."""
+        while self.running:
+            if time.time() - self.last_check >= 1.0:
+                self.last_check = time.time()
+                self.check_workers()
+            try:
+                item = self.result_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            source, seq, worker_id, face_locations, qualities, matches, encoded, busy_time, error = item
+            with self.lock:
+                if (source, seq) not in self.in_flight:
+                    continue    # returned as an error result already
+                self.idle.append(worker_id)
+                timestamp, context, _worker_id = self.in_flight.pop(
+                    (source, seq))
+                self.completed[(source, seq)] = RecognitionResult(
+                    source, seq, timestamp, worker_id, face_locations, qualities, matches, encoded, context, error)
+                self.stats[worker_id].busy_time += busy_time
+                self._dispatch()
+                self.results_ready.notify_all()
+
+    def _ready(self, source):
+        """Pop the results of 'source' not waiting for an older frame (lock held)."""
+        in_flight = [seq for key_source, seq in self.in_flight
+                     if key_source == source]
+        oldest_in_flight = min(in_flight) if in_flight else None
+        ready = []
+        for seq in sorted(seq for key_source, seq in self.completed if key_source == source):
+            if oldest_in_flight is not None and seq > oldest_in_flight:
+                break
+            ready.append(self.completed.pop((source, seq)))
+        return ready
+
+    def results(self, source=None, timeout=0.05):
+        """
+        Returns finished results of 'source' in sequence order. Waits up to
+        'timeout' seconds for a result if a frame of the source is in flight
+        and no worker is idle.
+        """
+        with self.results_ready:
+            ready = self._ready(source)
+            if not ready and timeout and not self.idle and \
+                    any(key_source == source for key_source, _seq in self.in_flight):
+                self.results_ready.wait(timeout)
+                ready = self._ready(source)
+
+            now = time.time()
+            for result in ready:
+                self.stats[result.worker_id].add(now - result.timestamp)
+
+            if now - self.last_report >= self.report_interval:
+                self.report()
+        return ready
+
+    def worker_stats(self):
+        return {worker_id: stats.as_dict() for worker_id, stats in self.stats.items()}
+
+    def report(self):
+        for worker_id, stats in self.worker_stats().items():
+            logger.debug(
+                f"Recognition worker {worker_id}: {stats['frames']} frames, {stats['fps']:.1f} fps, "
+                f"busy {stats['avg_busy_ms']:.0f} ms, age avg {stats['avg_age_ms']:.0f} ms "
+                f"max {stats['max_age_ms']:.0f} ms")
+        for source, counts in self.source_stats.items():
+            logger.debug(f"Recognition pool, {source}: {counts['submitted']} frames submitted, "
+                         f"{counts['dropped']} dropped (replaced by a newer frame), "
+                         f"{counts['stale']} stale")
+        self.last_report = time.time()
+
+    def terminate(self):
+        """Stop the worker processes."""
+        for task_queue in self.task_queues:
+            if task_queue is None:
+                continue
+            try:
+                task_queue.put(None, timeout=1)
+            except queue.Full:
+                pass
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+
+    def stop(self):
+        if self.gallery_changed in self.matcher.listeners:
+            self.matcher.listeners.remove(self.gallery_changed)
+        # no restarts of the workers from here on
+        self.running = False
+        if self.collector is not None:
+            self.collector.join()
+        with self.lock:
+            self.report()
+            self.pending.clear()
+        self.terminate()
+        logger.info("🔴 Recognition pool stopped")
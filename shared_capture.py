@@ -0,0 +1,343 @@
+# shared_capture.py
+
+import time
+import signal
+import threading
+import multiprocessing
+import cv2
+import numpy as np
+
+from multiprocessing import resource_tracker, shared_memory
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+RING_MAGIC = 0x52323041     # "R20A"
+HEADER_SIZE = 64            # int64 fields below, padded
+H_MAGIC, H_HEIGHT, H_WIDTH, H_CHANNELS, H_SLOTS, H_LATEST = range(6)
+
+
+class FrameRing:
+    """
+    Ring of decoded frames in a named multiprocessing.shared_memory block.
+
+    Layout: int64 header (magic, frame geometry, slot count, latest seq),
+    then per slot its seq (int64) and capture timestamp (float64), then the
+    frames as one (slots, height, width, channels) uint8 array.
+
+    There is one writer (the capture process). A slot is marked invalid
+    (seq 0) while it is written, then gets its new seq, and only then the
+    header's latest seq is advanced. Readers get read-only numpy views into
+    the block, no copy and no pickling; a view stays valid until the writer
+    wraps around to its slot, which valid(seq) tells.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray(
+            (HEADER_SIZE // 8,), dtype=np.int64, buffer=shm.buf)
+        if self.header[H_MAGIC] != RING_MAGIC:
+            raise ValueError(f"Shared memory '{shm.name}' is not a frame ring")
+        self.shape = (int(self.header[H_HEIGHT]), int(self.header[H_WIDTH]),
+                      int(self.header[H_CHANNELS]))
+        self.slots = int(self.header[H_SLOTS])
+        offset = HEADER_SIZE
+        self.slot_seq = np.ndarray(
+            (self.slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += 8 * self.slots
+        self.slot_time = np.ndarray(
+            (self.slots,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += 8 * self.slots
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8,
+                                 buffer=shm.buf, offset=offset)
+        if not owner:
+            self.header.flags.writeable = False
+            self.slot_seq.flags.writeable = False
+            self.slot_time.flags.writeable = False
+            self.frames.flags.writeable = False
+
+    @staticmethod
+    def size(shape, slots):
+        return HEADER_SIZE + 16 * slots + slots * int(np.prod(shape))
+
+    @classmethod
+    def create(cls, name, shape, slots):
+        """Create the ring (writer side), replacing a stale block of the same name."""
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            logger.warning(f"Removed stale frame ring '{name}'")
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(
+            name=name, create=True, size=cls.size(shape, slots))
+        header = np.ndarray((HEADER_SIZE // 8,),
+                            dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[H_HEIGHT], header[H_WIDTH], header[H_CHANNELS] = shape
+        header[H_SLOTS] = slots
+        header[H_MAGIC] = RING_MAGIC
+        del header
+        ring = cls(shm, owner=True)
+        ring.slot_seq[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        """Map an existing ring read-only (any process)."""
+        shm = shared_memory.SharedMemory(name=name)
+        # Python < 3.13 registers attached blocks too and would unlink the ring
+        # when this process exits; only the writer owns it.
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return cls(shm, owner=False)
+
+    @property
+    def latest_seq(self):
+        return int(self.header[H_LATEST])
+
+    def slot_for(self, seq):
+        return seq % self.slots
+
+    def begin_write(self, seq):
+        """Returns the frame buffer for 'seq', marked invalid until end_write()."""
+        slot = self.slot_for(seq)
+        self.slot_seq[slot] = 0
+        return self.frames[slot]
+
+    def end_write(self, seq, timestamp):
+        slot = self.slot_for(seq)
+        self.slot_time[slot] = timestamp
+        self.slot_seq[slot] = seq
+        self.header[H_LATEST] = seq
+
+    def valid(self, seq):
+        """True while the frame of 'seq' was not overwritten."""
+        return seq > 0 and self.slot_seq[self.slot_for(seq)] == seq
+
+    def read(self, seq):
+        """Returns (timestamp, frame view) of 'seq', or (None, None) if it is gone."""
+        slot = self.slot_for(seq)
+        timestamp = float(self.slot_time[slot])
+        if self.slot_seq[slot] != seq:
+            return None, None
+        return timestamp, self.frames[slot]
+
+    def near(self, timestamp):
+        """Returns (seq, timestamp, frame view) of the frame captured closest to 'timestamp'."""
+        seqs = self.slot_seq.copy()
+        if not seqs.any():
+            return 0, None, None
+        skews = np.where(seqs > 0, np.abs(self.slot_time - timestamp), np.inf)
+        seq = int(seqs[int(np.argmin(skews))])
+        frame_time, frame = self.read(seq)
+        return (seq, frame_time, frame) if frame is not None else (0, None, None)
+
+    def close(self):
+        # numpy views must be released before the mapping can be closed
+        self.header = self.slot_seq = self.slot_time = self.frames = None
+        if self.owner:
+            self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # frames still referenced by a consumer, unmapped when they are released
+            pass
+
+
+def reset_child_signals():
+    """
+    Default signal handling in a process forked from the face process: its
+    SIGTERM handler would only set this process's copy of shutdown_event, so
+    terminate() could not stop it. Ctrl+C reaches the whole process group,
+    the face process stops its children itself.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def capture_process(src, ring_name, slots, active_event, stop_event, ready_queue):
+    """
+    Capture process: grab the RTSP stream and decode frames straight into the ring.
+
+    Every packet is grabbed to keep up with the stream; frames are retrieved
+    (decoded into the ring slot, no extra copy) only while 'active_event' is set.
+    Puts the frame shape on 'ready_queue' once the ring exists (None on failure).
+    Stops on 'stop_event', or when the face process is gone without setting it.
+    """
+    reset_child_signals()
+    parent = multiprocessing.parent_process()
+    cap = cv2.VideoCapture(src)
+    grabbed, frame = cap.read()
+    if not grabbed:
+        logger.error("❌ Capture process: cannot read from the stream")
+        ready_queue.put(None)
+        cap.release()
+        return
+    ring = FrameRing.create(ring_name, frame.shape, slots)
+    seq = 1
+    ring.begin_write(seq)[:] = frame
+    ring.end_write(seq, time.time())
+    ready_queue.put(frame.shape)
+    logger.info(f"🎥 Capture process started (pid={multiprocessing.current_process().pid}, "
+                f"{frame.shape[1]}x{frame.shape[0]}, {slots} slots)")
+    del frame
+
+    last_parent_check = time.time()
+    try:
+        while not stop_event.is_set():
+            if parent is not None and time.time() - last_parent_check >= 1.0:
+                last_parent_check = time.time()
+                if not parent.is_alive():
+                    logger.warning(
+                        "⚠️ Capture process: face process gone, stopping")
+                    break
+            if not cap.grab():
+                time.sleep(0.01)
+                continue  # In a live stream, wait for the next frame
+            timestamp = time.time()
+            if not active_event.is_set():
+                continue
+            buffer = ring.begin_write(seq + 1)
+            ret, frame = cap.retrieve(buffer)
+            if not ret:
+                continue
+            if frame is not buffer:
+                # stream geometry changed, OpenCV allocated a new array
+                if frame.shape != buffer.shape:
+                    logger.error(
+                        f"❌ Capture process: frame size changed to {frame.shape}, frame dropped")
+                    continue
+                buffer[:] = frame
+            seq += 1
+            ring.end_write(seq, timestamp)
+    finally:
+        cap.release()
+        ring.close()
+
+
+class CaptureProcess:
+    """
+    Consumer side of the capture process, with the VideoCaptureThread interface
+    (start, read_next, stop) so the face detection loop can use either.
+
+    Frames are decoded only while someone is reading (read_next() within
+    'idle_after' seconds) or the pre-roll ring wants frames; otherwise the
+    capture process only grabs. Frames due for the pre-roll are taken from the
+    ring by a feeder thread of this process.
+    """
+
+    def __init__(self, src, ring_name, slots=8, preroll=None, idle_after=0.5):
+        self.src = src
+        self.ring_name = ring_name
+        self.slots = slots
+        self.preroll = preroll
+        self.idle_after = idle_after
+        self.active_event = multiprocessing.Event()
+        self.stop_event = multiprocessing.Event()
+        self.process = None
+        self.ring = None
+        self.last_read = 0
+        self.running = False
+        self.thread = None
+
+    def start(self, timeout=15):
+        ready_queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=capture_process,
+            args=(self.src, self.ring_name, self.slots, self.active_event, self.stop_event,
+                  ready_queue),
+            daemon=True)
+        self.process.start()
+        try:
+            shape = ready_queue.get(timeout=timeout)
+        except Exception:
+            shape = None
+        if shape is None:
+            logger.error("❌ Capture process did not start")
+            self.stop()
+            raise IOError(f"Cannot capture from '{self.src}'")
+        self.ring = FrameRing.attach(self.ring_name)
+        self.running = True
+        self.thread = threading.Thread(target=self.feed_preroll, daemon=True)
+        self.thread.start()
+        return self
+
+    def preroll_wanted(self, now):
+        return self.preroll is not None and self.preroll.wanted(now)
+
+    def feed_preroll(self):
+        """Keep the decoder active while needed and feed the pre-roll ring."""
+        seq = 0
+        while self.running:
+            now = time.time()
+            if now - self.last_read < self.idle_after or self.preroll_wanted(now):
+                self.active_event.set()
+            else:
+                self.active_event.clear()
+            if not self.preroll_wanted(now):
+                time.sleep(0.05)
+                continue
+            latest = self.ring.latest_seq
+            if latest == seq:
+                time.sleep(0.01)
+                continue
+            seq = latest
+            timestamp, frame = self.ring.read(seq)
+            if frame is not None and self.preroll.due(timestamp):
+                self.preroll.add(timestamp, frame)
+
+    def read_next(self, last_seq=0, timeout=1.0):
+        """
+        Returns (seq, timestamp, frame) of a frame newer than 'last_seq', waiting
+        up to 'timeout' seconds for it. 'frame' is None on timeout.
+        The frame is a read-only view into the ring, valid while valid(seq) is True.
+        """
+        self.last_read = time.time()
+        if not self.active_event.is_set():
+            # the latest frame in the ring may be from before the idle period
+            last_seq = max(last_seq, self.ring.latest_seq)
+            self.active_event.set()
+        deadline = self.last_read + timeout
+        while self.running:
+            seq = self.ring.latest_seq
+            if seq > last_seq:
+                timestamp, frame = self.ring.read(seq)
+                if frame is not None:
+                    return seq, timestamp, frame
+            if time.time() >= deadline:
+                break
+            time.sleep(0.002)
+        return last_seq, None, None
+
+    def frame_near(self, timestamp, max_skew):
+        """
+        Returns (seq, timestamp, frame) of the frame in the ring captured closest to
+        'timestamp', frame None if none is within 'max_skew' seconds. Keeps decoding on.
+        """
+        self.last_read = time.time()
+        self.active_event.set()
+        seq, frame_time, frame = self.ring.near(timestamp)
+        if frame is None or abs(frame_time - timestamp) > max_skew:
+            return 0, None, None
+        return seq, frame_time, frame
+
+    def valid(self, seq):
+        return self.ring is not None and self.ring.valid(seq)
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.stop_event.set()
+        if self.process is not None:
+            self.process.join(timeout=3)
+            if self.process.is_alive():
+                self.process.terminate()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
@@ -0,0 +1,168 @@
+# unknown_visitors.py
+
+import os
+import json
+import threading
+import cv2
+import numpy as np
+
+from gallery_index import ENCODING_SIZE, as_matrix
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+CENTROIDS_FILE = "centroids.npy"
+VISITORS_FILE = "visitors.json"
+STORE_VERSION = 1
+
+
+class UnknownVisitorStore:
+    """
+    Incremental clustering of unknown faces into stable pseudo-identities.
+
+    Each cluster keeps only its centroid (running mean of its encodings), a
+    hit count, first/last seen times and the latest event snapshot. A new
+    encoding is compared with all centroids in one vectorized pass and joins
+    the closest cluster within 'threshold', otherwise it starts a new one, so
+    adding is O(cluster count) and the history is never re-clustered.
+    IDs ("visitor-0001", ...) are never reused, so they stay stable across
+    restarts and can be used in events and as enrollment candidates.
+
+    The store directory holds:
+        centroids.npy   float32 (K, 128) matrix
+        visitors.json   cluster metadata in centroid row order, next id
+        <id>.jpg        latest snapshot of each visitor
+    """
+
+    def __init__(self, store_dir, threshold=0.5, max_visitors=500):
+        self.store_dir = store_dir
+        self.threshold = threshold
+        self.max_visitors = max_visitors
+        self.lock = threading.Lock()
+        self.centroids = np.empty((0, ENCODING_SIZE), dtype=np.float32)
+        self.visitors = []      # dicts in centroid row order
+        self.next_id = 1
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.store_dir, VISITORS_FILE), "r") as f:
+                data = json.load(f)
+            if data.get("version") != STORE_VERSION:
+                logger.info(
+                    "Unknown visitor store version changed, starting empty.")
+                return
+            centroids = np.load(os.path.join(self.store_dir, CENTROIDS_FILE))
+            if centroids.shape != (len(data["visitors"]), ENCODING_SIZE):
+                logger.warning(
+                    "Unknown visitor store is inconsistent, starting empty.")
+                return
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(
+                f"Unknown visitor store unreadable, starting empty: {e}")
+            return
+        self.centroids = centroids.astype(np.float32, copy=False)
+        self.visitors = data["visitors"]
+        self.next_id = data["next_id"]
+        logger.info(f"Loaded {len(self.visitors)} unknown visitors.")
+
+    def save(self):
+        """Atomically replace the store files (called with the lock held)."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        centroids_path = os.path.join(self.store_dir, CENTROIDS_FILE)
+        visitors_path = os.path.join(self.store_dir, VISITORS_FILE)
+        np.save(centroids_path + ".tmp.npy", self.centroids)
+        with open(visitors_path + ".tmp", "w") as f:
+            json.dump({"version": STORE_VERSION, "next_id": self.next_id,
+                       "visitors": self.visitors}, f)
+        os.replace(centroids_path + ".tmp.npy", centroids_path)
+        os.replace(visitors_path + ".tmp", visitors_path)
+
+    def snapshot_path(self, visitor_id):
+        return os.path.join(self.store_dir, visitor_id + ".jpg")
+
+    def _assign(self, encoding, timestamp):
+        """Add one encoding to its cluster, returns the visitor dict."""
+        if len(self.visitors):
+            distances = np.linalg.norm(self.centroids - encoding, axis=1)
+            row = int(np.argmin(distances))
+            if distances[row] <= self.threshold:
+                visitor = self.visitors[row]
+                visitor["count"] += 1
+                visitor["last_seen"] = timestamp
+                # running mean of all encodings of the cluster
+                delta = encoding - self.centroids[row]
+                self.centroids[row] += delta / visitor["count"]
+                return visitor
+
+        if len(self.visitors) >= self.max_visitors:
+            self._evict()
+        visitor = {"id": f"visitor-{self.next_id:04d}", "count": 1,
+                   "first_seen": timestamp, "last_seen": timestamp}
+        self.next_id += 1
+        self.visitors.append(visitor)
+        self.centroids = np.vstack([self.centroids, encoding[None, :]])
+        return visitor
+
+    def _evict(self):
+        """Drop the visitor seen least recently."""
+        row = min(range(len(self.visitors)),
+                  key=lambda i: self.visitors[i]["last_seen"])
+        visitor = self.visitors.pop(row)
+        self.centroids = np.delete(self.centroids, row, axis=0)
+        try:
+            os.remove(self.snapshot_path(visitor["id"]))
+        except OSError:
+            pass
+
+    def add(self, encodings, timestamp, snapshot=None):
+        """
+        Add the encodings of one unknown visitor (e.g. one per face track of an event).
+
+        Returns:
+            (visitor id, times seen) of the cluster holding most of them.
+        """
+        encodings = as_matrix(encodings)
+        if len(encodings) == 0:
+            return None, 0
+        with self.lock:
+            hits = {}
+            for encoding in encodings:
+                visitor = self._assign(encoding, timestamp)
+                hits[visitor["id"]] = hits.get(visitor["id"], 0) + 1
+            visitor_id = max(hits, key=hits.get)
+            count = next(v["count"] for v in self.visitors
+                         if v["id"] == visitor_id)
+            try:
+                self.save()
+                if snapshot is not None:
+                    cv2.imwrite(self.snapshot_path(visitor_id), snapshot)
+            except OSError as e:
+                logger.error(f"Failed to write unknown visitor store: {e}")
+        return visitor_id, count
+
+    def list(self, min_count=1):
+        """Visitors seen at least 'min_count' times, most frequent first."""
+        with self.lock:
+            visitors = [dict(v, snapshot=os.path.exists(self.snapshot_path(v["id"])))
+                        for v in self.visitors if v["count"] >= min_count]
+        return sorted(visitors, key=lambda v: v["count"], reverse=True)
+
+    def remove(self, visitor_id):
+        """Forget a visitor (e.g. after enrollment), returns False if unknown."""
+        with self.lock:
+            rows = [i for i, v in enumerate(self.visitors)
+                    if v["id"] == visitor_id]
+            if not rows:
+                return False
+            self.visitors.pop(rows[0])
+            self.centroids = np.delete(self.centroids, rows[0], axis=0)
+            try:
+                self.save()
+                if os.path.exists(self.snapshot_path(visitor_id)):
+                    os.remove(self.snapshot_path(visitor_id))
+            except OSError as e:
+                logger.error(f"Failed to write unknown visitor store: {e}")
+        return True
@@ -0,0 +1,74 @@
+# vote_filter.py
+
+import time
+import threading
+
+from collections import deque
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class VoteFilter:
+    """
+    Per-identity sliding-window vote filter for face recognition results.
+
+    Every identity keeps its own window of hit timestamps, so two people at
+    the door do not reset each other's count. An identity is accepted when
+    it got 'hits' votes within 'window' seconds; a gap longer than
+    'reset_gap' between two hits starts its count again. After acceptance
+    the identity is paused for 'pause' seconds, other identities are not.
+
+    update() takes all results of one frame at once: an identity gets at most
+    one vote per frame, however many faces carry its name. Names in 'ignored'
+    (failed recognition, faces not identified yet) never vote.
+    """
+
+    def __init__(self, hits=5, window=1.2, pause=10, reset_gap=0.5, ignored=("Error", None)):
+        self.hits = hits
+        self.window = window
+        self.pause = pause
+        self.reset_gap = reset_gap
+        self.ignored = set(ignored)
+        self.lock = threading.Lock()
+        self.votes = {}         # name -> deque of hit timestamps
+        self.pause_until = {}   # name -> end of the pause after acceptance
+
+    def update(self, names, timestamp=None):
+        """
+        Add the recognized names of one frame.
+
+        Returns:
+            list of names accepted with this frame.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        accepted = []
+        with self.lock:
+            for name in set(names) - self.ignored:
+                if timestamp < self.pause_until.get(name, 0):
+                    continue
+                votes = self.votes.setdefault(name, deque())
+                if votes and timestamp - votes[-1] > self.reset_gap:
+                    votes.clear()
+                votes.append(timestamp)
+                while timestamp - votes[0] > self.window:
+                    votes.popleft()
+                if len(votes) >= self.hits:
+                    votes.clear()
+                    self.pause_until[name] = timestamp + self.pause
+                    accepted.append(name)
+                    logger.info(
+                        f"✅ Vote filter accepted '{name}', paused for {self.pause} s")
+
+            # forget identities that are gone
+            for name in [n for n, v in self.votes.items() if not v or timestamp - v[-1] > self.window]:
+                del self.votes[name]
+            for name in [n for n, until in self.pause_until.items() if until <= timestamp]:
+                del self.pause_until[name]
+        return accepted
+
+    def reset(self):
+        with self.lock:
+            self.votes.clear()
+            self.pause_until.clear()